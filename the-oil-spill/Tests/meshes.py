@@ -0,0 +1,40 @@
+import meshio
+import numpy as np
+from src.Simulation.cells import Line, Point, Triangle
+
+
+def grid_cells(xs, bottom_lines=False):
+    """ a square mesh with grid lines at xs in both directions, two triangles per grid square,
+    and lines along the bottom if bottom_lines. The neighbors of every cell are found """
+    points = [[Point(x, y) for x in xs] for y in xs]
+    cells = []
+    for j in range(len(xs) - 1):
+        for i in range(len(xs) - 1):
+            cells.append(Triangle(len(cells), [points[j][i], points[j][i + 1], points[j + 1][i + 1]]))
+            cells.append(Triangle(len(cells), [points[j][i], points[j + 1][i + 1], points[j + 1][i]]))
+    if bottom_lines:
+        for i in range(len(xs) - 1):
+            cells.append(Line(len(cells), [points[0][i], points[0][i + 1]]))
+    for cell in cells:
+        cell.find_neighbors(cells)
+    return cells
+
+
+def write_square_mesh(path, n=4, width=1.0):
+    """ writes a small triangulated unit square, or a rectangle of the given width,
+    with boundary lines as a gmsh file """
+    xs = np.linspace(0, 1, n + 1)
+    points = np.array([[x * width, y, 0.0] for y in xs for x in xs])
+    index = lambda i, j: j * (n + 1) + i
+    triangles = []
+    for j in range(n):
+        for i in range(n):
+            triangles.append([index(i, j), index(i + 1, j), index(i + 1, j + 1)])
+            triangles.append([index(i, j), index(i + 1, j + 1), index(i, j + 1)])
+    lines = []
+    for k in range(n):
+        lines += [[index(k, 0), index(k + 1, 0)], [index(n, k), index(n, k + 1)],
+                  [index(k + 1, n), index(k, n)], [index(0, k + 1), index(0, k)]]
+    mesh = meshio.Mesh(points, [("line", np.array(lines)), ("triangle", np.array(triangles))])
+    meshio.write(str(path), mesh, file_format="gmsh22", binary=False)
+    return str(path)
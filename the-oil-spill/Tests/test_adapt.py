@@ -0,0 +1,191 @@
+import numpy as np
+import pytest
+from src.Simulation.adapt import AdaptiveMesh, Refinement
+from src.Simulation.geometry import FluxGeometry
+from src.Simulation.mesh import Mesh
+from src.Simulation.solver import Solver
+from Tests.meshes import grid_cells
+
+
+@pytest.fixture
+def square_cells():
+    """ a square mesh of 8 x 8 x 2 triangles with lines along the bottom """
+    return grid_cells(np.linspace(0, 1, 9), bottom_lines=True)
+
+
+def oil(cells):
+    """ the oil value of every cell """
+    return np.array([cell.u for cell in cells])
+
+
+def mass(adaptive, u):
+    """ the amount of oil in the leaf triangles """
+    geometry = adaptive.geometry()
+    return np.dot(u[geometry.updated], geometry.areas)
+
+
+def check_faces(adaptive):
+    """ every leaf is closed by its faces and every face to a triangle has an opposite face """
+    geometry = adaptive.geometry()
+    owners = np.repeat(geometry.updated, np.diff(geometry.offsets))
+    coefficients = {}
+    for owner, neighbor, coefficient in zip(owners, geometry.neighbors, geometry.coefficients):
+        coefficients[(owner, neighbor)] = coefficients.get((owner, neighbor), 0) + coefficient
+    for (owner, neighbor), coefficient in coefficients.items():
+        if neighbor in geometry.updated:
+            assert coefficients[(neighbor, owner)] == pytest.approx(-coefficient, abs=1e-15)
+
+    # Only the faces to the lines and the open sides are missing from the sum of the normals
+    sums = np.add.reduceat(geometry.normals, geometry.offsets[:-1], axis=0)
+    closed = geometry.offsets[1:] - geometry.offsets[:-1] == [len(adaptive._faces[cell]) for cell in geometry.updated]
+    assert closed.all()
+    return sums
+
+
+def test_matches_flux_geometry(square_cells):
+    """ before any split the faces are the faces of the mesh """
+    expected = FluxGeometry(square_cells)
+    geometry = AdaptiveMesh(square_cells).geometry()
+
+    assert np.array_equal(geometry.updated, expected.updated)
+    assert np.array_equal(geometry.offsets, expected.offsets)
+    assert np.array_equal(np.sort(geometry.neighbors), np.sort(expected.neighbors))
+    assert np.allclose(np.add.reduceat(geometry.coefficients, geometry.offsets[:-1]),
+                       np.add.reduceat(expected.coefficients, expected.offsets[:-1]))
+
+
+def test_refine_and_coarsen_keep_oil(square_cells):
+    """ splitting and merging never changes the amount of oil and the faces stay consistent """
+    adaptive = AdaptiveMesh(square_cells)
+    u = oil(square_cells)
+    start_mass = mass(adaptive, u)
+    n_leaves = len(adaptive.leaves)
+
+    refinement = Refinement(1, 0.3, 0.0, max_level=2)
+    for level in range(2):
+        u = adaptive.adapt(u, refinement)
+        check_faces(adaptive)
+        assert mass(adaptive, u) == pytest.approx(start_mass, rel=1e-14)
+    assert len(adaptive.leaves) > n_leaves
+    assert adaptive.levels.max() == 2
+    assert np.allclose(adaptive.project(u), oil(square_cells))
+
+    merge = Refinement(1, 2.0, 1.5)
+    for level in range(2):
+        u = adaptive.adapt(u, merge)
+        check_faces(adaptive)
+        assert mass(adaptive, u) == pytest.approx(start_mass, rel=1e-14)
+    assert len(adaptive.leaves) == n_leaves
+    assert np.allclose(u[adaptive.leaves], oil(square_cells)[adaptive.leaves])
+
+
+def test_children_split_faces_of_neighbors(square_cells):
+    """ a triangle next to a split one gets a face to each child on the shared edge """
+    adaptive = AdaptiveMesh(square_cells)
+    u = np.zeros(adaptive.n_cells)
+    u[0] = 1.0
+    u = adaptive.adapt(u, Refinement(1, 0.5, 0.0, max_level=1))
+
+    assert len(adaptive.leaves) == 128 + 3
+    # the shared edge now has a face to each of the two children on it, the other side is open
+    neighbors = [face.neighbor for face in adaptive._faces[1]]
+    assert 0 not in neighbors
+    assert len(neighbors) == 3
+    assert len(set(neighbors) & set(adaptive._children[0])) == 2
+    # the line under the split triangle is a neighbor of one child only
+    bottom = [face for cell in adaptive.leaves for face in adaptive._faces[cell] if face.neighbor == 128]
+    assert len(bottom) == 2
+
+
+def test_packed_faces_follow_changes(square_cells):
+    """ after splits and merges the packed faces are the faces of the leaves,
+    and the slots that are no longer used are taken again or packed away """
+    adaptive = AdaptiveMesh(square_cells)
+    u = oil(square_cells)
+    split, merge = Refinement(1, 0.05, 0.0, max_level=2), Refinement(1, 2.0, 1.5)
+    for refinement in (split, split, merge, split, merge, merge):
+        u = adaptive.adapt(u, refinement)
+        geometry = adaptive.geometry()
+        faces = [face for cell in geometry.updated for face in adaptive._faces[cell]]
+        assert np.array_equal(geometry.neighbors, [face.neighbor for face in faces])
+        assert np.array_equal(geometry.coefficients, [face.coefficient for face in faces])
+        assert np.array_equal(geometry.normals, [face.normal for face in faces])
+        assert adaptive._n_faces <= 2 * len(faces)
+
+
+def test_gradient_refinement(square_cells):
+    """ the gradient threshold splits triangles at the edge of the oil """
+    adaptive = AdaptiveMesh(square_cells)
+    u = np.zeros(adaptive.n_cells)
+    u[:64] = 1.0
+    gradients = adaptive.gradients(u)
+    u = adaptive.adapt(u, Refinement(1, 2.0, 0.0, refine_gradient=1.0, max_level=1))
+
+    assert np.count_nonzero(gradients > 1.0) > 0
+    assert len(adaptive.leaves) == 128 + 3 * np.count_nonzero(gradients > 1.0)
+
+
+def test_refinement_thresholds():
+    """ coarsening above the refinement threshold is not allowed """
+    with pytest.raises(ValueError):
+        Refinement(1, 0.1, 0.2)
+    with pytest.raises(ValueError):
+        Refinement(0, 0.2, 0.1)
+
+
+def test_adaptive_solver():
+    """ the adaptive solver is the plain solver when nothing is split,
+    and otherwise gives the oil values on the cells of the mesh that was read """
+    mesh = Mesh("bay.msh")
+    borders = [[0.0, 0.45], [0.0, 0.2]]
+    plain = Solver(mesh, borders, [], 0.0)
+    unchanged = Solver(mesh, borders, [], 0.0, refinement=Refinement(1, 2.0, 0.0))
+    adaptive = Solver(mesh, borders, [], 0.0, refinement=Refinement(2, 0.3, 0.05, max_level=1))
+    assert unchanged.n_triangles == plain.n_triangles
+    assert adaptive.n_triangles > plain.n_triangles
+    assert adaptive.mass() == pytest.approx(plain.mass(), rel=1e-12)
+
+    # The split triangles are smaller so the time step must be stable for them too
+    for _ in range(4):
+        assert unchanged.solve(0.001) == pytest.approx(plain.solve(0.001), rel=1e-12)
+        mass = adaptive.mass()
+        adaptive.solve(0.001)
+        assert adaptive.mass() <= mass * (1 + 1e-12)
+    assert np.allclose(unchanged.oil_list, plain.oil_list)
+    assert len(adaptive.oil_list) == len(mesh.cells)
+
+
+def test_steppers_are_kept():
+    """ the stepper and its threads are given the adapted geometry instead of being made again """
+    mesh = Mesh("bay.msh")
+    borders = [[0.0, 0.45], [0.0, 0.2]]
+    threaded = Solver(mesh, borders, [], 0.0, threads=2, refinement=Refinement(2, 0.3, 0.05, max_level=1))
+    local = Solver(mesh, borders, [], 0.0, local_stepping=True, refinement=Refinement(2, 0.3, 0.05, max_level=1))
+    jacobi, pool, multirate = threaded._jacobi, threaded._jacobi._pool, local.multirate
+    for _ in range(4):
+        threaded.solve(0.001)
+        local.solve(0.001)
+    assert threaded._jacobi is jacobi and jacobi._pool is pool
+    assert local.multirate is multirate
+    assert jacobi._geometry is threaded._geometry and multirate._geometry is local._geometry
+    threaded.close()
+
+
+def test_time_step_of_refined_mesh():
+    """ a time step that is only stable on the mesh that was read is refused once triangles are split,
+    local time stepping sub-cycles the split triangles instead """
+    mesh = Mesh("bay.msh")
+    borders = [[0.0, 0.45], [0.0, 0.2]]
+    dt = 0.0045
+    plain = Solver(mesh, borders, [], 0.0)
+    adaptive = Solver(mesh, borders, [], 0.0, refinement=Refinement(5, 0.05, 0.01, max_level=2))
+    assert adaptive.stable_step < dt < plain.stable_step
+    with pytest.raises(ValueError):
+        adaptive.solve(dt)
+    assert adaptive.time == 0.0
+
+    local = Solver(mesh, borders, [], 0.0, local_stepping=True, refinement=Refinement(5, 0.05, 0.01, max_level=2))
+    mass = local.mass()
+    for _ in range(10):
+        local.solve(dt)
+    assert local.mass() <= mass * (1 + 1e-12)
@@ -0,0 +1,88 @@
+import os
+import pytest
+from cache import ResultCache
+from config import ReadConfig
+from events import Event
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """ runs the test in an empty folder with a mesh file """
+    monkeypatch.chdir(tmp_path)
+    with open("mesh.msh", "w") as file:
+        file.write("not really a mesh")
+    return tmp_path
+
+
+def make_conf(name="a", nSteps=10, tEnd=1, logName="log"):
+    """ makes a config from a dict """
+    return ReadConfig(f"{name}.toml", {
+        "settings": {"nSteps": nSteps, "tEnd": tEnd},
+        "geometry": {"meshName": "mesh.msh", "borders": [[0, 0.45], [0, 0.2]]},
+        "IO": {"logName": logName},
+    })
+
+
+def test_key_ignores_names_and_number_types(workdir):
+    """ configs that only differ in names or int / float give the same key """
+    cache = ResultCache("cache")
+    assert cache.key(make_conf()) == cache.key(make_conf(name="b", tEnd=1.0, logName="other"))
+    assert cache.key(make_conf()) != cache.key(make_conf(nSteps=11))
+
+
+def test_key_changes_with_mesh_content(workdir):
+    """ a changed mesh file gives a new key """
+    cache = ResultCache("cache")
+    key = cache.key(make_conf())
+    with open("mesh.msh", "w") as file:
+        file.write("another mesh")
+    assert cache.key(make_conf()) != key
+
+
+def test_store_and_restore(workdir):
+    """ a stored result gives back the solution, time series and frames """
+    cache = ResultCache("cache")
+    os.makedirs("imgs")
+    os.makedirs("a")
+    for path in ["imgs/oil_dist_0.00.png", "a/oil_dist_1.00.png", "imgs/oil_dist_1.00.png"]:
+        with open(path, "w") as file:
+            file.write(path)
+
+    cache.store("key", 1.0, [0.5, 0.25], [(0.5, 0.1), (1.0, 0.2)],
+                ["imgs/oil_dist_0.00.png", "imgs/oil_dist_1.00.png"], "a/oil_dist_1.00.png")
+    assert "key" in cache
+    for path in ["imgs/oil_dist_0.00.png", "a/oil_dist_1.00.png", "imgs/oil_dist_1.00.png"]:
+        os.remove(path)
+
+    result = cache.restore("key", "b")
+    assert result.time == 1.0
+    assert result.oil_list == [0.5, 0.25]
+    assert result.series == [(0.5, 0.1), (1.0, 0.2)]
+    assert os.path.isfile("imgs/oil_dist_0.00.png")
+    assert os.path.isfile("imgs/oil_dist_1.00.png")
+    assert os.path.isfile("b/oil_dist_1.00.png")
+
+
+def test_least_recently_used_is_evicted(workdir):
+    """ the cache keeps at most max_entries results, dropping the least recently used """
+    cache = ResultCache("cache", max_entries=2)
+    cache.store("first", 1.0, [0.0], [], [])
+    cache.store("second", 1.0, [0.0], [], [])
+    os.utime(os.path.join("cache", "first"), (0, 0))
+    os.utime(os.path.join("cache", "second"), (1, 1))
+    cache.restore("first", "a")
+    cache.store("third", 1.0, [0.0], [], [])
+
+    assert "first" in cache
+    assert "second" not in cache
+    assert "third" in cache
+
+
+def test_events_are_stored(workdir):
+    """ the events of a simulation come back with the result """
+    cache = ResultCache("cache")
+    event = Event("steady state", 3, 0.4, 1e-5, True)
+    cache.store("key", 0.4, [0.0], [(0.1, 0.0)] * 4, [], events=[event])
+    assert cache.restore("key", "a").events == [event]
+    cache.store("other", 0.4, [0.0], [], [])
+    assert cache.restore("other", "a").events == []
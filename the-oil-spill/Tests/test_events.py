@@ -0,0 +1,85 @@
+import pytest
+from config import ReadConfig
+from events import EventMonitor, make_monitor
+from main import time_loop
+from src.Simulation.adapt import Refinement
+from src.Simulation.solver import Solver
+
+
+def test_thresholds():
+    """ every threshold is an event the first time it is reached, the last one can stop the simulation """
+    monitor = EventMonitor(1.0, [0.5, 0.2])
+    assert not monitor.check(0, 0.1, 0.1)
+    assert not monitor.check(1, 0.2, 0.6)
+    assert not monitor.check(2, 0.3, 0.7)
+    assert [(event.step, event.value) for event in monitor.events] == [(1, 0.2), (1, 0.5)]
+    assert monitor.stopped == None
+
+    monitor = EventMonitor(1.0, [0.2, 0.5], stop_on_threshold=True)
+    assert not monitor.check(0, 0.1, 0.3)
+    assert monitor.check(1, 0.2, 0.5)
+    assert monitor.stopped.value == 0.5
+
+
+def test_mass_and_steady_state():
+    """ the simulation stops when the oil is almost gone or nothing changes for some steps """
+    monitor = EventMonitor(2.0, mass_epsilon=0.1)
+    assert monitor.needs_mass and not monitor.needs_change
+    assert not monitor.check(0, 0.1, 0.0, mass=0.5)
+    assert monitor.check(1, 0.2, 0.0, mass=0.1)
+
+    monitor = EventMonitor(1.0, steady_tolerance=1e-3, steady_steps=3)
+    changes = [1.0, 1e-4, 1e-4, 1.0, 1e-4, 1e-4, 1e-4]
+    stops = [monitor.check(step, step * 0.1, 0.0, change=change) for step, change in enumerate(changes)]
+    assert stops == [False] * 6 + [True]
+    assert monitor.stopped.name == "steady state"
+
+    # Unknown changes neither count nor start the count again
+    monitor = EventMonitor(1.0, steady_tolerance=1e-3, steady_steps=3)
+    changes = [1e-4, float("inf"), 1e-4, float("inf"), 1e-4]
+    stops = [monitor.check(step, step * 0.1, 0.0, change=change) for step, change in enumerate(changes)]
+    assert stops == [False] * 4 + [True]
+
+
+def test_invalid_events():
+    """ events that can not happen are not allowed """
+    with pytest.raises(ValueError):
+        EventMonitor(1.0, mass_epsilon=1.5)
+    with pytest.raises(ValueError):
+        EventMonitor(1.0, stop_on_threshold=True)
+    with pytest.raises(ValueError):
+        EventMonitor(1.0, steady_tolerance=1e-3, steady_steps=0)
+
+
+def test_make_monitor(tmp_path, monkeypatch):
+    """ the monitor is only made when the config has an events section """
+    monkeypatch.chdir(tmp_path)
+    sections = {"settings": {"nSteps": 10, "tEnd": 1}, "geometry": {"meshName": "bay.msh", "borders": []}, "IO": {}}
+    assert make_monitor(ReadConfig("a.toml", sections), 1.0) == None
+
+    sections["events"] = {"fishingThreshold": 0.1, "massEpsilon": 0.5}
+    monitor = make_monitor(ReadConfig("a.toml", sections), 1.0)
+    assert monitor.needs_mass
+    assert ReadConfig("a.toml", sections).sections["events"] == sections["events"]
+
+
+def test_time_loop_stops_early():
+    """ the time loop ends after the step where the monitor stops it """
+    solver = Solver("bay.msh", [[0.0, 0.45], [0.0, 0.2]], [], 0.0)
+    assert solver.change() == float("inf")
+    monitor = EventMonitor(solver.mass(), [0.0], stop_on_threshold=True, steady_tolerance=0.0)
+
+    steps = [step for step, _ in time_loop(solver, 0.001, 50, monitor=monitor)]
+    assert steps == [0]
+    assert 0 < solver.change() < float("inf")
+    assert monitor.stopped.time == solver.time
+
+
+def test_steady_state_with_refinement():
+    """ adapting the mesh more often than the steady steps does not keep the simulation from stopping """
+    solver = Solver("bay.msh", [[0.0, 0.45], [0.0, 0.2]], [], 0.0, refinement=Refinement(3, 0.3, 0.05, max_level=1))
+    monitor = EventMonitor(solver.mass(), steady_tolerance=1e9, steady_steps=5)
+
+    steps = [step for step, _ in time_loop(solver, 0.001, 30, monitor=monitor)]
+    assert monitor.stopped.name == "steady state"
+    assert steps == list(range(7))
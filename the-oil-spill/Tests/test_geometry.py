@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from src.Simulation.cells import Point, Triangle, Line
+from src.Simulation.geometry import FluxGeometry
+
+
+@pytest.fixture
+def cells():
+    """ two triangles sharing an edge, one with a boundary line """
+    p1, p2, p3, p4 = Point(0, 0), Point(1, 0), Point(0, 1), Point(1, 1)
+    cells = [Triangle(0, [p1, p2, p3]), Triangle(1, [p2, p4, p3]), Line(2, [p1, p2])]
+    for cell in cells:
+        cell.find_neighbors(cells)
+    return cells
+
+
+def test_faces(cells):
+    """ the faces of each triangle are stored in neighbor order """
+    geometry = FluxGeometry(cells)
+
+    assert geometry.updated.tolist() == [0, 1]
+    assert geometry.offsets.tolist() == [0, 2, 3]
+    assert geometry.neighbors.tolist() == [1, 2, 0]
+    assert geometry.wet.tolist() == [True, False, True]
+    np.testing.assert_allclose(geometry.areas, [0.5, 0.5])
+    np.testing.assert_allclose(geometry.normals[1], [0, -1])
+
+
+def test_coefficients(cells):
+    """ the flux coefficient is the average velocity dot the normal """
+    geometry = FluxGeometry(cells)
+    expected = np.sum(geometry.velocities * geometry.normals, axis=1)
+    np.testing.assert_allclose(geometry.coefficients, expected)
+    # The shared face seen from the two triangles has opposite flux
+    assert geometry.coefficients[0] == pytest.approx(-geometry.coefficients[2])
+
+
+def test_float32(cells):
+    """ float32 geometry is stored with half the memory for the values """
+    double, single = FluxGeometry(cells), FluxGeometry(cells, np.float32)
+    assert single.dtype == np.float32
+    assert single.areas.dtype == np.float32
+    assert single.coefficients.dtype == np.float32
+    assert single.nbytes < double.nbytes
@@ -0,0 +1,51 @@
+import meshio
+import numpy as np
+import pytest
+from src.Simulation.gmsh import is_gmsh41_ascii, read_gmsh41
+
+
+def test_same_as_meshio():
+    """ bay.msh gives the same points and triangle and line blocks as meshio """
+    expected = meshio.read("bay.msh")
+    msh = read_gmsh41("bay.msh")
+
+    np.testing.assert_array_equal(msh.points, expected.points[:, :2])
+    expected_cells = [block for block in expected.cells if block.type in ("line", "triangle")]
+    assert [block.type for block in msh.cells] == [block.type for block in expected_cells]
+    for block, expected_block in zip(msh.cells, expected_cells):
+        np.testing.assert_array_equal(block.data, expected_block.data)
+
+
+def test_format_check(tmp_path):
+    """ only gmsh 4.1 ASCII files are read without meshio """
+    old = tmp_path / "old.msh"
+    meshio.write(str(old), meshio.Mesh(np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]),
+                                       [("triangle", np.array([[0, 1, 2]]))]), file_format="gmsh22", binary=False)
+    assert is_gmsh41_ascii("bay.msh")
+    assert not is_gmsh41_ascii(str(old))
+    assert not is_gmsh41_ascii("invalid_file.msh")
+    with pytest.raises(ValueError):
+        read_gmsh41(str(old))
+
+
+def test_tags_and_parametric_nodes(tmp_path):
+    """ node tags that are not in order and parametric nodes are read """
+    file = tmp_path / "small.msh"
+    file.write_text(
+        "$MeshFormat\n4.1 0 8\n$EndMeshFormat\n"
+        "$Nodes\n2 4 3 10\n"
+        "0 1 0 1\n10\n0 0 0\n"
+        "1 1 1 3\n3\n5\n7\n1 0 0 0.1\n0 1 0 0.2\n1 1 0 0.3\n"
+        "$EndNodes\n"
+        "$Elements\n3 4 1 4\n"
+        "0 1 15 1\n1 10 \n"
+        "1 1 1 1\n2 10 3 \n"
+        "2 1 2 2\n3 10 3 5\n4 3 7 5\n"
+        "$EndElements\n"
+    )
+    msh = read_gmsh41(str(file))
+
+    np.testing.assert_array_equal(msh.points, [[0, 0], [1, 0], [0, 1], [1, 1]])
+    assert [block.type for block in msh.cells] == ["line", "triangle"]
+    np.testing.assert_array_equal(msh.cells[0].data, [[0, 1]])
+    np.testing.assert_array_equal(msh.cells[1].data, [[0, 1, 2], [1, 3, 2]])
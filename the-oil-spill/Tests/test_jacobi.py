@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from src.Simulation.geometry import FluxGeometry
+from src.Simulation.jacobi import JacobiStepper
+from src.Simulation.oilmath import OilMath
+from Tests.meshes import grid_cells
+
+
+@pytest.fixture
+def square():
+    """ a square mesh of triangles with boundary lines at the bottom """
+    cells = grid_cells(np.linspace(0, 1, 9), bottom_lines=True)
+
+    oil_math = OilMath()
+    u = np.array([oil_math.calculate_u(cell.midpoint.x, cell.midpoint.y) for cell in cells])
+    return FluxGeometry(cells), u
+
+
+def test_step_uses_old_values(square):
+    """ every triangle is updated from the old values only """
+    geometry, u = square
+    dt = 0.01
+    u_new = u.copy()
+    JacobiStepper(geometry).step(u, u_new, dt)
+
+    for k, i in enumerate(geometry.updated):
+        faces = slice(geometry.offsets[k], geometry.offsets[k + 1])
+        c = geometry.coefficients[faces]
+        u_ngh = np.where(geometry.wet[faces], u[geometry.neighbors[faces]], 0)
+        flux = np.sum(np.where(c > 0, u[i], u_ngh) * c)
+        assert u_new[i] == pytest.approx(max(0, u[i] - dt / geometry.areas[k] * flux), rel=1e-12)
+    # Lines are not updated
+    assert np.array_equal(u_new[-8:], u[-8:])
+
+
+@pytest.mark.parametrize("threads", [2, 3, 5, 16])
+def test_same_result_for_any_threads(square, threads):
+    """ the result is bit for bit the same for any number of threads """
+    geometry, u = square
+    single, parallel = u.copy(), u.copy()
+    one, many = JacobiStepper(geometry), JacobiStepper(geometry, threads)
+    for _ in range(20):
+        one.step(single.copy(), single, 0.01)
+        many.step(parallel.copy(), parallel, 0.01)
+    many.close()
+
+    assert np.array_equal(single, parallel)
+
+
+def test_threads_must_be_positive(square):
+    """ zero threads is not accepted """
+    geometry, _ = square
+    with pytest.raises(ValueError):
+        JacobiStepper(geometry, 0)
@@ -0,0 +1,90 @@
+import logging
+import numpy as np
+import os
+import pytest
+from config import ReadConfig
+from main import setup_solver
+from src.Simulation.geometry import FluxGeometry
+from src.Simulation.multirate import MultirateStepper
+from src.Simulation.oilmath import OilMath
+from Tests.meshes import grid_cells
+
+
+@pytest.fixture
+def graded_geometry():
+    """ a closed square mesh with cells from very small to large """
+    cells = grid_cells([0.0, 0.005, 0.01, 0.02, 0.05, 0.15, 0.4, 1.0])
+    return FluxGeometry(cells), cells
+
+
+def start_oil(cells):
+    """ the oil distribution at time 0 """
+    oil_math = OilMath()
+    return np.array([oil_math.calculate_u(cell.midpoint.x, cell.midpoint.y) for cell in cells])
+
+
+def test_levels(graded_geometry):
+    """ small cells get higher levels and the levels keep every cell stable """
+    geometry, _ = graded_geometry
+    stepper = MultirateStepper(geometry)
+    dt = 0.05
+    levels = stepper.levels(dt)
+
+    assert levels.max() > levels.min() + 2, "A graded mesh should have several levels"
+    assert np.all(dt / 2 ** levels <= stepper.stable_steps())
+    local_work, global_work = stepper.work(dt)
+    assert local_work < global_work
+
+
+def test_max_level(graded_geometry):
+    """ no cell gets a level above the largest level """
+    geometry, _ = graded_geometry
+    assert MultirateStepper(geometry, max_level=1).levels(0.05).max() == 1
+    assert MultirateStepper(geometry, max_level=1).required_level(0.05) == MultirateStepper(geometry).levels(0.05).max() > 1
+    with pytest.raises(ValueError):
+        MultirateStepper(geometry, max_level=-1)
+
+
+def test_conservation(graded_geometry):
+    """ without boundary lines no oil leaves the mesh, so the total is kept """
+    geometry, cells = graded_geometry
+    stepper = MultirateStepper(geometry)
+    u = start_oil(cells)
+    mass = np.dot(u[geometry.updated], geometry.areas)
+
+    for _ in range(5):
+        stepper.step(u, 0.05)
+
+    assert np.all(u >= 0)
+    assert np.dot(u[geometry.updated], geometry.areas) == pytest.approx(mass, rel=1e-12)
+
+
+def test_one_level_is_a_single_step(graded_geometry):
+    """ with every cell on level 0 the step is one update from the old values """
+    geometry, cells = graded_geometry
+    stepper = MultirateStepper(geometry, max_level=0)
+    dt = 1e-4
+    u = start_oil(cells)
+    old = u.copy()
+    stepper.step(u, dt)
+
+    for k, i in enumerate(geometry.updated):
+        faces = slice(geometry.offsets[k], geometry.offsets[k + 1])
+        c = geometry.coefficients[faces]
+        u_ngh = old[geometry.neighbors[faces]]
+        flux = np.sum(np.where(c > 0, old[i], u_ngh) * c)
+        assert u[i] == pytest.approx(max(0, old[i] - dt / geometry.areas[k] * flux), rel=1e-12)
+
+
+def test_setup_refuses_too_few_levels(tmp_path, monkeypatch):
+    """ a time step that needs more levels than maxLevel is an error instead of an unstable step """
+    mesh_file = os.path.abspath("bay.msh")
+    monkeypatch.chdir(tmp_path)
+    sections = {"settings": {"nSteps": 50, "tEnd": 1, "localTimeStepping": True, "maxLevel": 0},
+                "geometry": {"meshName": mesh_file, "borders": [[0, 0.45], [0, 0.2]]}, "IO": {}}
+    with pytest.raises(ValueError, match="maxLevel"):
+        setup_solver(ReadConfig("levels.toml", sections), logging.getLogger("test_multirate"))
+
+    sections["settings"]["maxLevel"] = 3
+    msh, dt, _ = setup_solver(ReadConfig("levels.toml", sections), logging.getLogger("test_multirate"))
+    assert msh.multirate.required_level(dt) == 3
@@ -0,0 +1,96 @@
+import logging
+import numpy as np
+import pytest
+from config import ReadConfig
+from main import setup_solver
+from src.Simulation.mesh import Mesh
+from src.Simulation.remap import GridIndex, intersection_areas, remap, triangle_areas, _triangles
+from Tests.meshes import write_square_mesh
+
+
+def mass(mesh, oil_list):
+    """ the oil value times area summed over the triangles """
+    index, triangles = _triangles(mesh)
+    return np.dot(np.array(oil_list)[index], triangle_areas(triangles))
+
+
+def test_intersection_areas():
+    """ overlaps of triangles in both corner orders, and triangles that do not meet """
+    a = np.array([[[0, 0], [1, 0], [0, 1]]] * 4, dtype=float)
+    b = np.array([[[0, 0], [1, 0], [1, 1]], [[0, 1], [1, 0], [0, 0]], [[2, 2], [3, 2], [2, 3]],
+                  [[0.5, -1], [0.5, 2], [-1, 0.5]]], dtype=float)
+    assert np.allclose(intersection_areas(a, b), [0.25, 0.5, 0.0, intersection_areas(b[3:], a[3:])[0]])
+    assert intersection_areas(a, a)[0] == pytest.approx(0.5)
+
+
+def test_grid_index_finds_every_overlap():
+    """ the grid gives the same pairs as comparing every box with every triangle """
+    rng = np.random.default_rng(1)
+    triangles = rng.random((300, 1, 2)) + 0.1 * rng.random((300, 3, 2))
+    low = rng.random((100, 2))
+    high = low + 0.05
+    boxes, found = GridIndex(triangles).query(low, high)
+
+    tri_low, tri_high = triangles.min(axis=1), triangles.max(axis=1)
+    expected = {(i, j) for i in range(100) for j in range(300)
+                if np.all(low[i] <= tri_high[j]) and np.all(tri_low[j] <= high[i])}
+    assert set(zip(boxes.tolist(), found.tolist())) == expected
+
+
+def test_remap_keeps_oil(tmp_path):
+    """ moving oil between two meshes keeps the amount, a constant and the same mesh """
+    coarse = Mesh(write_square_mesh(tmp_path / "coarse.msh", 4))
+    fine = Mesh(write_square_mesh(tmp_path / "fine.msh", 7))
+    oil = [cell.u for cell in coarse.cells]
+
+    remapped = remap(coarse, oil, fine)
+    assert len(remapped) == len(fine.cells)
+    assert mass(fine, remapped) == pytest.approx(mass(coarse, oil), rel=1e-12)
+
+    index, _ = _triangles(fine)
+    assert np.allclose(np.array(remap(coarse, [1.0] * len(coarse.cells), fine))[index], 1.0)
+    index, _ = _triangles(coarse)
+    assert np.allclose(np.array(remap(coarse, oil, coarse))[index], np.array(oil)[index])
+
+    with pytest.raises(ValueError):
+        remap(coarse, oil[:-1], fine)
+
+
+def test_remap_to_part_of_the_mesh(tmp_path, caplog):
+    """ oil outside the target mesh is lost and logged instead of being scaled into the target """
+    whole = Mesh(write_square_mesh(tmp_path / "whole.msh", 4))
+    half = Mesh(write_square_mesh(tmp_path / "half.msh", 2, width=0.5))
+    oil = [1.0] * len(whole.cells)
+
+    with caplog.at_level(logging.WARNING):
+        remapped = remap(whole, oil, half, logging.getLogger("test_remap"))
+    index, _ = _triangles(half)
+    assert np.allclose(np.array(remapped)[index], 1.0)
+    assert mass(half, remapped) == pytest.approx(0.5 * mass(whole, oil), rel=1e-12)
+    assert "does not cover" in caplog.text
+
+
+def test_restart_on_other_mesh(tmp_path, monkeypatch):
+    """ a restart file of a coarse mesh is remapped when the solver is set up and is not overwritten """
+    monkeypatch.chdir(tmp_path)
+    coarse = Mesh(write_square_mesh(tmp_path / "coarse.msh", 4))
+    write_square_mesh(tmp_path / "fine.msh", 7)
+    oil = [cell.u for cell in coarse.cells]
+    with open("restart.txt", "w") as file:
+        file.writelines(f"{value}\n" for value in oil)
+
+    conf = ReadConfig("remap.toml", {
+        "settings": {"nSteps": 2, "tStart": 0.1, "tEnd": 0.2},
+        "geometry": {"meshName": "fine.msh", "borders": [[0, 0.45], [0, 0.2]]},
+        "IO": {"restartFile": "restart.txt", "restartMesh": "coarse.msh"},
+    })
+    loaded = []
+    load_mesh = lambda file: loaded.append(file) or Mesh(file)
+    msh, _, _ = setup_solver(conf, logging.getLogger("test_remap"), load_mesh=load_mesh)
+    assert loaded == ["fine.msh", "coarse.msh"], "Both meshes should be read with the given loader"
+    assert len(msh.oil_list) == len(Mesh("fine.msh").cells)
+    assert msh.mass() == pytest.approx(mass(coarse, oil), rel=1e-12)
+
+    conf.store_solutions(msh)
+    with open("restart.txt") as file:
+        assert len(file.readlines()) == len(oil)
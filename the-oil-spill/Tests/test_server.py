@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import pytest
+import server
+import threading
+from server import MeshCache, SimulationServer
+from Tests.meshes import write_square_mesh
+
+
+@pytest.fixture
+def square_mesh(tmp_path):
+    """ a small mesh file so the tests run fast """
+    return write_square_mesh(tmp_path / "square.msh")
+
+
+def test_mesh_cache_reuses_meshes(square_mesh, tmp_path):
+    """ the same file is only read once and the least recently used mesh is dropped """
+    cache = MeshCache(size=1)
+    first = cache.get(square_mesh)
+    second = cache.get(square_mesh)
+
+    assert len(cache) == 1
+    assert first is second
+
+    other = write_square_mesh(tmp_path / "other.msh", n=2)
+    cache.get(other)
+    assert len(cache) == 1
+    assert cache.files[0].endswith("other.msh")
+
+
+def test_mesh_cache_key_changes_with_content(square_mesh):
+    """ rewriting a mesh file gives a new cache key, an unchanged file is only hashed once """
+    cache = MeshCache()
+    key = cache.key(square_mesh)
+    # A file with the same size and modification time is not hashed again
+    stat = os.stat(square_mesh)
+    with open(square_mesh, "rb+") as file:
+        file.write(b"#")
+    os.utime(square_mesh, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.key(square_mesh) == key
+
+    write_square_mesh(square_mesh, n=2)
+    assert cache.key(square_mesh) != key
+
+
+def test_mesh_cache_reads_without_lock(square_mesh, tmp_path, monkeypatch):
+    """ a cached mesh is returned while another mesh is being read,
+    and a mesh read twice at the same time is only kept once """
+    cache = MeshCache()
+    cached = cache.get(square_mesh)
+    other = write_square_mesh(tmp_path / "other.msh", n=2)
+
+    reading, release = threading.Event(), threading.Event()
+    read_mesh = server.Mesh
+    def slow_mesh(file):
+        reading.set()
+        release.wait(5)
+        return read_mesh(file)
+    monkeypatch.setattr(server, "Mesh", slow_mesh)
+
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(cache.get(other))) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    assert reading.wait(5)
+    assert cache.get(square_mesh) is cached
+    release.set()
+    for worker in workers:
+        worker.join()
+    assert results[0] is results[1]
+    assert len(cache) == 2
+
+
+async def request(port, method, path, payload=None):
+    """ sends a http request and returns the status and the json lines in the response """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload != None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    return status, [json.loads(line) for line in content.splitlines() if line]
+
+
+def test_server_streams_simulation(square_mesh, tmp_path, monkeypatch):
+    """ running a payload streams one progress line per step and the final solution """
+    monkeypatch.chdir(tmp_path)
+    payload = {
+        "settings": {"nSteps": 3, "tEnd": 0.03},
+        "geometry": {"meshName": square_mesh, "borders": [[0.0, 0.5], [0.0, 0.5]]},
+        "IO": {},
+    }
+
+    async def scenario():
+        app = SimulationServer(workers=1)
+        server = await app.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            first = await request(port, "POST", "/run", payload)
+            second = await request(port, "POST", "/run", payload)
+            missing = await request(port, "POST", "/run", {"settings": {}})
+            status = await request(port, "GET", "/status")
+        finally:
+            server.close()
+            app.close()
+        return first, second, missing, status
+
+    first, second, missing, status = asyncio.run(scenario())
+
+    status_code, messages = first
+    assert status_code == 200
+    assert [m["event"] for m in messages] == ["queued", "started", "progress", "progress", "progress", "done"]
+    assert len(messages[-1]["series"]) == 3
+    assert len(messages[-1]["solution"]) == 32 + 16
+    assert second[1][-1]["solution"] == messages[-1]["solution"], "A cached mesh should give the same result"
+
+    assert missing[0] == 400
+    assert status[1][0]["meshes"] == [square_mesh]
+    assert not (tmp_path / "server").exists(), "A payload should not make a result folder"
+
+
+def test_server_cancels_job(square_mesh, tmp_path, monkeypatch):
+    """ a running job stops with a cancelled line when it is deleted """
+    monkeypatch.chdir(tmp_path)
+    payload = {
+        "settings": {"nSteps": 100000, "tEnd": 1.0},
+        "geometry": {"meshName": square_mesh, "borders": [[0.0, 0.5], [0.0, 0.5]]},
+        "IO": {},
+    }
+
+    async def scenario():
+        app = SimulationServer(workers=1)
+        server = await app.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            body = json.dumps(payload).encode()
+            writer.write(f"POST /run HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            await reader.readuntil(b"\r\n\r\n")
+            job = json.loads(await reader.readline())["job"]
+            while json.loads(await reader.readline())["event"] != "progress":
+                pass
+            cancelled = await request(port, "DELETE", f"/jobs/{job}")
+            last = [json.loads(line) for line in (await reader.read()).splitlines()][-1]
+            writer.close()
+            unknown = await request(port, "DELETE", f"/jobs/{job}")
+        finally:
+            server.close()
+            app.close()
+        return cancelled, last, unknown
+
+    cancelled, last, unknown = asyncio.run(scenario())
+    assert cancelled[0] == 200
+    assert last["event"] == "cancelled"
+    assert last["step"] < 100000 - 1
+    assert unknown[0] == 404
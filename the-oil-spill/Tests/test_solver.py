@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 from src.Simulation.solver import Solver
 
 @pytest.fixture
@@ -29,3 +30,34 @@ def test_solver(valid_solver):
 
     assert len(valid_solver._oil_list) > 0, "Updated oil distribution is empty."
     assert all(u >= 0 for u in valid_solver._oil_list), "Updated oil distribution contains negative values."
+
+
+def test_float32_solver(valid_solver):
+    """ test that float32 storage stays close to float64 and sums fishing grounds in float64 """
+    single = Solver(valid_solver._mesh, [[0.35, 0.45],[0.35, 0.45]], [], 0.0, "float32")
+    assert single.precision == "float32"
+    assert single.nbytes < valid_solver.nbytes, "float32 should use less memory"
+
+    dt = 0.01
+    oil, oil_single = valid_solver.solve(dt), single.solve(dt)
+    assert isinstance(oil_single, float)
+    assert oil_single == pytest.approx(oil, rel=1e-5)
+    np.testing.assert_allclose(single.oil_list, valid_solver.oil_list, atol=1e-6)
+    assert single.mass() == pytest.approx(valid_solver.mass(), rel=1e-5)
+
+
+def test_unknown_precision(valid_solver):
+    """ test that an unknown precision is not accepted """
+    with pytest.raises(ValueError):
+        Solver(valid_solver._mesh, [[0.35, 0.45],[0.35, 0.45]], [], 0.0, "float16")
+
+
+def test_threads_give_same_result(valid_solver):
+    """ test that the solution does not depend on the number of threads """
+    threaded = Solver(valid_solver._mesh, [[0.35, 0.45],[0.35, 0.45]], [], 0.0, threads=3)
+    for _ in range(5):
+        oil, oil_threaded = valid_solver.solve(0.001), threaded.solve(0.001)
+    threaded.close()
+
+    assert oil == oil_threaded
+    assert valid_solver.oil_list == threaded.oil_list
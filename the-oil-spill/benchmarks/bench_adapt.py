@@ -0,0 +1,63 @@
+""" Compares the adaptive mesh with a coarse and a uniformly fine square mesh: cells, time and
+the amount of oil (oil value times area) in fishing grounds at the end.
+Run from the project folder with: python -m benchmarks.bench_adapt [n] [levels] [tEnd] [dt] """
+from benchmarks.bench_gmsh import write_square
+from src.Simulation.adapt import Refinement
+from src.Simulation.mesh import Mesh
+from src.Simulation.solver import Solver
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+
+BORDERS = [[0.0, 0.45], [0.0, 0.2]]
+
+
+def fishing_oil(solver: Solver) -> float:
+    """ Returns the oil value times area summed over the updated triangles in fishing grounds """
+    geometry = solver._geometry
+    if solver.adaptive != None:
+        midpoints = solver.adaptive.midpoints[geometry.updated]
+    else:
+        midpoints = np.array([solver._mesh.cells[cell].midpoint.point for cell in geometry.updated])
+    inside = ((BORDERS[0][0] < midpoints[:, 0]) & (midpoints[:, 0] < BORDERS[0][1]) &
+              (BORDERS[1][0] < midpoints[:, 1]) & (midpoints[:, 1] < BORDERS[1][1]))
+    return float(np.dot(solver._oil_list[geometry.updated][inside], geometry.areas[inside]))
+
+
+def run(mesh: Mesh, t_end: float, dt: float, refinement=None) -> dict:
+    """ Solves up to t_end with steps of dt and returns the timing and results """
+    solver = Solver(mesh, BORDERS, [], 0.0, refinement=refinement)
+    steps = int(round(t_end / dt))
+    triangles = []
+    start = time.perf_counter()
+    for _ in range(steps):
+        solver.solve(dt)
+        triangles.append(solver.n_triangles)
+    return {"seconds": time.perf_counter() - start, "triangles": int(np.mean(triangles)),
+            "fishing": fishing_oil(solver), "mass": solver.mass()}
+
+
+def main(n: int = 32, levels: int = 2, t_end: float = 0.3, dt: float = 0.001) -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        coarse_file, fine_file = os.path.join(folder, "coarse.msh"), os.path.join(folder, "fine.msh")
+        write_square(coarse_file, n)
+        write_square(fine_file, n * 2 ** levels)
+        coarse, fine = Mesh(coarse_file), Mesh(fine_file)
+
+    results = {
+        f"coarse {n}": run(coarse, t_end, dt),
+        f"adaptive {n}+{levels}": run(coarse, t_end, dt, Refinement(10, 0.05, 0.01, 2.0, 0.5, levels)),
+        f"fine {n * 2 ** levels}": run(fine, t_end, dt),
+    }
+    reference = results[f"fine {n * 2 ** levels}"]["fishing"]
+    print(f"square meshes up to t = {t_end} with dt = {dt}, fishing grounds {BORDERS}")
+    print(f"{'mesh':>14} {'triangles':>10} {'time [s]':>10} {'fishing oil':>12} {'error':>8}")
+    for name, result in results.items():
+        print(f"{name:>14} {result['triangles']:10d} {result['seconds']:10.3f} {result['fishing']:12.4e} "
+              f"{abs(result['fishing'] - reference) / reference:8.2%}")
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((int, int, float, float), sys.argv[1:])))
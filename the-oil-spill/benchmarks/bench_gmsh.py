@@ -0,0 +1,69 @@
+""" Compares the gmsh 4.1 reader with meshio: parse time and peak memory.
+Run from the project folder with: python -m benchmarks.bench_gmsh [mesh] [n]
+Besides the given mesh a n x n square mesh is written to a temporary file and read """
+from src.Simulation.gmsh import read_gmsh41
+import meshio
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def measure(read, file: str) -> tuple:
+    """ Returns the seconds and the peak traced memory in bytes for reading the file """
+    tracemalloc.start()
+    start = time.perf_counter()
+    msh = read(file)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del msh
+    return seconds, peak
+
+
+def write_square(file: str, n: int) -> None:
+    """ Writes a triangulated n x n square with boundary lines as a gmsh 4.1 ASCII file """
+    xs = np.linspace(0, 1, n + 1)
+    x, y = np.meshgrid(xs, xs)
+    index = np.arange(1, (n + 1) ** 2 + 1).reshape(n + 1, n + 1)
+    a, b, c, d = index[:-1, :-1].ravel(), index[:-1, 1:].ravel(), index[1:, 1:].ravel(), index[1:, :-1].ravel()
+    triangles = np.concatenate([np.column_stack([a, b, c]), np.column_stack([a, c, d])])
+    edge = np.concatenate([index[0], index[1:, -1], index[-1, -2::-1], index[-2::-1, 0]])
+    lines = np.column_stack([edge[:-1], edge[1:]])
+    n_points, n_elements = index.size, len(lines) + len(triangles)
+
+    with open(file, "w") as f:
+        f.write("$MeshFormat\n4.1 0 8\n$EndMeshFormat\n")
+        f.write(f"$Nodes\n1 {n_points} 1 {n_points}\n2 1 0 {n_points}\n")
+        np.savetxt(f, index.ravel(), fmt="%d")
+        np.savetxt(f, np.column_stack([x.ravel(), y.ravel(), np.zeros(n_points)]), fmt="%.16g")
+        f.write(f"$EndNodes\n$Elements\n2 {n_elements} 1 {n_elements}\n1 1 1 {len(lines)}\n")
+        np.savetxt(f, np.column_stack([np.arange(1, len(lines) + 1), lines]), fmt="%d")
+        f.write(f"2 1 2 {len(triangles)}\n")
+        np.savetxt(f, np.column_stack([np.arange(len(lines) + 1, n_elements + 1), triangles]), fmt="%d")
+        f.write("$EndElements\n")
+
+
+def compare(file: str) -> None:
+    """ Prints the time and memory for both readers """
+    meshio_seconds, meshio_peak = measure(meshio.read, file)
+    gmsh_seconds, gmsh_peak = measure(read_gmsh41, file)
+    print(f"{file} ({os.path.getsize(file) / 2**20:.1f} MB)")
+    print(f"{'reader':>12} {'time [s]':>10} {'peak [MB]':>10}")
+    print(f"{'meshio':>12} {meshio_seconds:10.3f} {meshio_peak / 2**20:10.2f}")
+    print(f"{'read_gmsh41':>12} {gmsh_seconds:10.3f} {gmsh_peak / 2**20:10.2f}")
+    print(f"speedup = {meshio_seconds / gmsh_seconds:.2f}x, peak memory = {gmsh_peak / meshio_peak:.0%} of meshio\n")
+
+
+def main(mesh_file: str = "bay.msh", n: int = 500) -> None:
+    compare(mesh_file)
+    with tempfile.TemporaryDirectory() as folder:
+        square = os.path.join(folder, f"square_{n}.msh")
+        write_square(square, n)
+        compare(square)
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((str, int), sys.argv[1:])))
@@ -0,0 +1,36 @@
+""" Compares local time stepping with every cell taking the smallest stable time step.
+Run from the project folder with: python -m benchmarks.bench_multirate [mesh] [tEnd] [dt] """
+from src.Simulation.mesh import Mesh
+from src.Simulation.solver import Solver
+import numpy as np
+import sys
+import time
+
+
+def run(mesh: Mesh, t_end: float, dt: float, max_level: int) -> dict:
+    """ Solves up to t_end with steps of dt and returns the timing and results """
+    solver = Solver(mesh, [[0.0, 0.45], [0.0, 0.2]], [], 0.0, local_stepping=True, max_level=max_level)
+    steps = int(round(t_end / dt))
+    start = time.perf_counter()
+    for _ in range(steps):
+        solver.solve(dt)
+    return {"seconds": time.perf_counter() - start, "work": steps * solver.multirate.work(dt)[0],
+            "levels": np.bincount(solver.multirate.levels(dt)).tolist(), "solution": np.array(solver.oil_list)}
+
+
+def main(mesh_file: str = "bay.msh", t_end: float = 0.4, dt: float = 0.04) -> None:
+    mesh = Mesh(mesh_file)
+    local = run(mesh, t_end, dt, 8)
+    fine_dt = dt / 2 ** (len(local["levels"]) - 1)
+    single = run(mesh, t_end, fine_dt, 0)
+
+    print(f"{mesh_file}: {len(mesh.cells)} cells up to t = {t_end}, cells per level = {local['levels']}")
+    print(f"{'stepping':>10} {'dt':>10} {'faces':>10} {'time [s]':>10}")
+    print(f"{'local':>10} {dt:10.5f} {local['work']:10d} {local['seconds']:10.3f}")
+    print(f"{'global':>10} {fine_dt:10.5f} {single['work']:10d} {single['seconds']:10.3f}")
+    print(f"work saved = {1 - local['work'] / single['work']:.1%}, speedup = {single['seconds'] / local['seconds']:.2f}x, "
+          f"max difference = {np.max(np.abs(local['solution'] - single['solution'])):.3e}")
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((str, float, float), sys.argv[1:])))
@@ -0,0 +1,45 @@
+""" Compares float32 and float64 solvers on a mesh: time per step, memory and error.
+Run from the project folder with: python -m benchmarks.bench_precision [mesh] [steps] """
+from src.Simulation.mesh import Mesh
+from src.Simulation.solver import Solver
+import numpy as np
+import sys
+import time
+
+
+def run(mesh: Mesh, precision: str, steps: int, dt: float) -> dict:
+    """ Solves the steps and returns the timings and results """
+    borders = [[0.0, 0.45], [0.0, 0.2]]
+    start = time.perf_counter()
+    solver = Solver(mesh, borders, [], 0.0, precision)
+    setup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        oil = solver.solve(dt)
+    per_step = (time.perf_counter() - start) / steps
+
+    return {"setup": setup, "per_step": per_step, "nbytes": solver.nbytes, "oil": oil,
+            "mass": solver.mass(), "solution": np.array(solver.oil_list)}
+
+
+def main(mesh_file: str = "bay.msh", steps: int = 50, dt: float = 0.0004) -> None:
+    mesh = Mesh(mesh_file)
+    double = run(mesh, "float64", steps, dt)
+    single = run(mesh, "float32", steps, dt)
+
+    error = single["solution"] - double["solution"]
+    print(f"{mesh_file}: {len(mesh.cells)} cells, {steps} steps of dt = {dt}")
+    print(f"{'precision':>10} {'setup [s]':>10} {'step [ms]':>10} {'memory [kB]':>12}")
+    for name, result in (("float64", double), ("float32", single)):
+        print(f"{name:>10} {result['setup']:10.3f} {1e3 * result['per_step']:10.3f} {result['nbytes'] / 1024:12.1f}")
+    print(f"speedup per step = {double['per_step'] / single['per_step']:.2f}x, "
+          f"memory saved = {1 - single['nbytes'] / double['nbytes']:.1%}")
+    print(f"max abs error = {np.max(np.abs(error)):.3e}, "
+          f"relative L2 error = {np.linalg.norm(error) / np.linalg.norm(double['solution']):.3e}")
+    print(f"fishing grounds: {double['oil']:.10f} vs {single['oil']:.10f}, "
+          f"mass: {double['mass']:.10f} vs {single['mass']:.10f}")
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((str, int, float), sys.argv[1:])))
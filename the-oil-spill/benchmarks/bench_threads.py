@@ -0,0 +1,48 @@
+""" Measures the time per step for different numbers of threads and checks that the results are the same.
+Run from the project folder with: python -m benchmarks.bench_threads [n] [steps]
+bay.msh and a n x n square mesh written to a temporary file are used """
+from benchmarks.bench_gmsh import write_square
+from src.Simulation.mesh import Mesh
+from src.Simulation.solver import Solver
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+
+
+def compare(mesh: Mesh, name: str, steps: int, dt: float) -> None:
+    """ Prints the time per step, speedup and speedup per used core for 1, 2, 4, 8 and all cores """
+    cores = os.cpu_count() or 1
+    thread_counts = sorted({1, 2, 4, 8, cores})
+    print(f"{name}: {len(mesh.cells)} cells, {steps} steps, {cores} cores")
+    print(f"{'threads':>8} {'step [ms]':>10} {'speedup':>8} {'per core':>9} {'identical':>10}")
+
+    reference, single = None, None
+    for threads in thread_counts:
+        solver = Solver(mesh, [[0.0, 0.45], [0.0, 0.2]], [], 0.0, threads=threads)
+        start = time.perf_counter()
+        for _ in range(steps):
+            solver.solve(dt)
+        per_step = (time.perf_counter() - start) / steps
+        solver.close()
+
+        solution = np.array(solver.oil_list)
+        if reference is None:
+            reference, single = solution, per_step
+        identical = np.array_equal(solution, reference)
+        speedup = single / per_step
+        print(f"{threads:8d} {1e3 * per_step:10.3f} {speedup:8.2f} {speedup / min(threads, cores):9.2f} {str(identical):>10}")
+    print()
+
+
+def main(n: int = 300, steps: int = 100) -> None:
+    compare(Mesh("bay.msh"), "bay.msh", steps, 0.0005)
+    with tempfile.TemporaryDirectory() as folder:
+        square = os.path.join(folder, f"square_{n}.msh")
+        write_square(square, n)
+        compare(Mesh(square), f"{n} x {n} square", steps, 0.1 / n)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
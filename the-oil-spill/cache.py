@@ -0,0 +1,178 @@
+from config import ReadConfig
+from events import Event
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+class CachedResult:
+    """ A simulation result restored from the result cache """
+    def __init__(self, time: float, oil_list: List[float], series: List[Tuple[float, float]],
+                 events: Optional[List[Event]] = None) -> None:
+        self._time = time
+        self._oil_list = oil_list
+        self._series = series
+        self._events = events if events != None else []
+
+    @property
+    def time(self) -> float:
+        """ Returns the end time of the simulation """
+        return self._time
+
+    @property
+    def oil_list(self) -> List[float]:
+        """ Returns the final oil value for each cell index in order """
+        return self._oil_list
+
+    @property
+    def series(self) -> List[Tuple[float, float]]:
+        """ Returns the time and amount of oil in fishing grounds for every step """
+        return self._series
+
+    @property
+    def events(self) -> List[Event]:
+        """ Returns the events found while the simulation ran """
+        return self._events
+
+
+class ResultCache:
+    """ A content addressed cache of simulation results on disk.
+
+    The key is a hash of the normalised config sections together with the content of
+    the mesh file and the restart file, so configs that only differ in names or
+    in how numbers are written share a result. The least recently used results are
+    removed when there are more than max_entries or they take more than max_bytes """
+    # Config entries that only name files or outputs, the content of the files is hashed instead.
+    # The number of threads does not change the result
+    _ignored = {"settings": ["threads"], "geometry": ["meshName"], "IO": ["logName", "restartFile", "restartMesh"]}
+    # Changed when the solver gives other results, so older results are not used
+    _version = 2
+
+    def __init__(self, folder: str = ".result_cache", max_entries: int = 32, max_bytes: int = 512 * 2**20) -> None:
+        if max_entries < 1 or max_bytes <= 0:
+            raise ValueError("The result cache must be able to hold at least one result")
+        self._folder = folder
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        os.makedirs(self._folder, exist_ok=True)
+
+    @property
+    def folder(self) -> str:
+        """ Returns the folder of the cache """
+        return self._folder
+
+    def key(self, conf: ReadConfig) -> str:
+        """ Returns the hash of the normalised config, the mesh file, the restart file and the restart mesh """
+        sections = conf.sections
+        for section, keys in self._ignored.items():
+            for key in keys:
+                sections[section].pop(key, None)
+
+        sections["version"] = self._version
+        digest = hashlib.sha256(json.dumps(self._normalise(sections), sort_keys=True).encode())
+        files = [conf.geometry("meshName"), conf.restart_file]
+        # The restart mesh is only hashed when it is given, so the other keys stay the same
+        if conf.restart_mesh != None:
+            files.append(conf.restart_mesh)
+        for file in files:
+            if file == None:
+                digest.update(b"\0")
+                continue
+            with open(file, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    @classmethod
+    def _normalise(cls, value):
+        """ Writes every number as a float, so 1 and 1.0 give the same key """
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, dict):
+            return {key: cls._normalise(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [cls._normalise(item) for item in value]
+        return value
+
+    def _entry(self, key: str) -> str:
+        """ Returns the folder of a cached result """
+        return os.path.join(self._folder, key)
+
+    def __contains__(self, key: str) -> bool:
+        """ Checks if there is a result for the key """
+        return os.path.isfile(os.path.join(self._entry(key), "result.json"))
+
+    def store(self, key: str, time: float, oil_list: List[float], series: List[Tuple[float, float]],
+              frames: List[str], result_frame: Optional[str] = None, events: Optional[List[Event]] = None) -> None:
+        """ Stores the final solution, the time series, the events and the plotted frames,
+        result_frame is the image saved in the config folder """
+        temporary = tempfile.mkdtemp(dir=self._folder, prefix=".store_")
+        os.makedirs(os.path.join(temporary, "frames"))
+        for frame in frames:
+            shutil.copyfile(frame, os.path.join(temporary, "frames", os.path.basename(frame)))
+
+        result = {
+            "time": time,
+            "series": [[t, float(oil)] for t, oil in series],
+            "frames": [os.path.basename(frame) for frame in frames],
+            "result_frame": os.path.basename(result_frame) if result_frame != None else None,
+            "events": [[event.name, event.step, event.time, float(event.value), event.stop] for event in events or []],
+        }
+        if result_frame != None and result_frame not in frames:
+            shutil.copyfile(result_frame, os.path.join(temporary, "frames", result["result_frame"]))
+        with open(os.path.join(temporary, "result.json"), "w") as file:
+            json.dump(result, file)
+        with open(os.path.join(temporary, "solution.txt"), "w") as file:
+            for oil in oil_list:
+                file.write(f"{oil}\n")
+
+        entry = self._entry(key)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(temporary, entry)
+        os.utime(entry)
+        self._evict()
+
+    def restore(self, key: str, result_folder: str, frames_folder: str = "imgs") -> CachedResult:
+        """ Copies the cached frames to the frames folder and the result frame to the result folder,
+        returns the cached result """
+        entry = self._entry(key)
+        with open(os.path.join(entry, "result.json"), "r") as file:
+            result = json.load(file)
+        with open(os.path.join(entry, "solution.txt"), "r") as file:
+            oil_list = [float(line.strip()) for line in file]
+
+        os.makedirs(frames_folder, exist_ok=True)
+        for frame in result["frames"]:
+            shutil.copyfile(os.path.join(entry, "frames", frame), os.path.join(frames_folder, frame))
+        if result["result_frame"] != None:
+            os.makedirs(result_folder, exist_ok=True)
+            shutil.copyfile(os.path.join(entry, "frames", result["result_frame"]),
+                            os.path.join(result_folder, result["result_frame"]))
+
+        os.utime(entry)     # Marks the result as recently used
+        series = [(t, oil) for t, oil in result["series"]]
+        events = [Event(*event) for event in result.get("events", [])]
+        return CachedResult(result["time"], oil_list, series, events)
+
+    def _evict(self) -> None:
+        """ Removes the least recently used results until the cache is within its limits """
+        entries = []
+        for name in os.listdir(self._folder):
+            entry = self._entry(name)
+            if name.startswith(".") or not os.path.isdir(entry):
+                continue
+            size = sum(os.path.getsize(os.path.join(root, file))
+                       for root, _, files in os.walk(entry) for file in files)
+            entries.append((os.path.getmtime(entry), size, entry))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self._max_entries or total > self._max_bytes):
+            _, size, entry = entries.pop(0)
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -2,7 +2,7 @@ import toml
 import cv2
 import argparse
 import os
-from typing import Union, Tuple
+from typing import Optional, Union, Tuple
 
 def parseInput():
     """ Makes a the arguments in terminal for running the simulation """
@@ -10,17 +10,29 @@ def parseInput():
     parser.add_argument("--config_file", "-c", help="Path to the config file.", default="input.toml")
     parser.add_argument("--find_all", action="store_true", help="Run all config files in the folder.")
     parser.add_argument("--folder", "-f", help="Folder to search for config files.", default="")
+    parser.add_argument("--serve", action="store_true", help="Run a local simulation server instead of a single simulation.")
+    parser.add_argument("--host", help="Host the server listens on.", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="Port the server listens on.", default=8765)
+    parser.add_argument("--socket", help="Unix socket path for the server, used instead of host and port.", default=None)
+    parser.add_argument("--workers", type=int, help="Maximum number of simulations the server runs at once.", default=2)
+    parser.add_argument("--mesh_cache", type=int, help="Number of meshes the server keeps in memory.", default=4)
+    parser.add_argument("--recompute", action="store_true", help="Run the simulation even if the result is cached.")
+    parser.add_argument("--result_cache", help="Folder where simulation results are cached.", default=".result_cache")
+    parser.add_argument("--cache_entries", type=int, help="Maximum number of cached simulation results.", default=32)
+    parser.add_argument("--cache_mb", type=float, help="Maximum size of the result cache in megabytes.", default=512)
     args = parser.parse_args()
     return args
 
 class ReadConfig:
-    """ A class that defines a config file """
-    def __init__(self, conf_path: str) -> None:
-        try:
-            with open(conf_path, "r") as file:
-                conf = toml.load(file)
-        except:
-            raise FileNotFoundError(f"The {conf_path} toml file does not exist")
+    """ A class that defines a config file, or a dict with the same sections when conf is given.
+    The results are saved in a folder with the name of the config, which is not made if make_folder is False """
+    def __init__(self, conf_path: str, conf: Optional[dict] = None, make_folder: bool = True) -> None:
+        if conf == None:
+            try:
+                with open(conf_path, "r") as file:
+                    conf = toml.load(file)
+            except:
+                raise FileNotFoundError(f"The {conf_path} toml file does not exist")
         
         # Checking if config file has required keys """
         required_keys = ["settings", "geometry", "IO"]
@@ -30,12 +42,15 @@ class ReadConfig:
 
         # Makes the folder with config files name
         self._toml_name = os.path.splitext(os.path.basename(conf_path))[0]
-        os.makedirs(self._toml_name, exist_ok=True)
+        if make_folder:
+            os.makedirs(self._toml_name, exist_ok=True)
 
         # Define different sections in toml file
         self._settings = conf.get("settings", {})
         self._geometry = conf.get("geometry", {}) 
         self._io = conf.get("IO", {})
+        # Optional stop conditions and events
+        self._events = conf.get("events", {})
 
 
         self._logname = self._io.get("logName")
@@ -44,6 +59,8 @@ class ReadConfig:
         if self._logname == None: self._logname = f"{self._toml_name}\logfile"
 
         self._restart_file = self._io.get("restartFile")
+        # The mesh the restart file was written for, when it is not the mesh of this simulation
+        self._restart_mesh = self._io.get("restartMesh")
         self._frequency = self._io.get("writeFrequency")
 
     @property
@@ -56,25 +73,50 @@ class ReadConfig:
         """ Returns the name of config file """
         return self._toml_name
 
+    @property
+    def restart_file(self) -> Optional[str]:
+        """ Returns the restart file given by the config file """
+        return self._restart_file
+
+    @property
+    def restart_mesh(self) -> Optional[str]:
+        """ Returns the mesh the restart file belongs to, None if it belongs to the simulation mesh """
+        return self._restart_mesh
+
+    @property
+    def sections(self) -> dict:
+        """ Returns a copy of the settings, geometry and IO sections, and the events section if there is one """
+        sections = {"settings": dict(self._settings), "geometry": dict(self._geometry), "IO": dict(self._io)}
+        if self._events:
+            sections["events"] = dict(self._events)
+        return sections
+
     @property
     def logname(self) -> str:
         """ Returns the logname given by the config file """
         return self._logname
 
-    def settings(self, key: str) -> Union[str, int]:
-        """ Returns a parameter asked for in the settings section """
-        parameter = self._settings.get(key)
+    def settings(self, key: str, default=None) -> Union[str, int]:
+        """ Returns a parameter asked for in the settings section,
+        the default is used for optional parameters """
+        parameter = self._settings.get(key, default)
         if parameter == None:
             raise ValueError(f"The specified toml file has a inconsistent/missing entry, {key}")
         return parameter
     
-    def geometry(self, key: str) -> Union[str, list]:
-        """ Returns a parameter asked for in the geometry section """
-        parameter = self._geometry.get(key)
+    def geometry(self, key: str, default=None) -> Union[str, list]:
+        """ Returns a parameter asked for in the geometry section,
+        the default is used for optional parameters """
+        parameter = self._geometry.get(key, default)
         if parameter == None:
             raise ValueError(f"The specified toml file has a inconsistent/missing entry, {key}")
         return parameter
 
+    def events(self, key: str, default=None):
+        """ Returns a parameter asked for in the events section, every event is optional
+        so the default is returned when it is not given """
+        return self._events.get(key, default)
+
     def find_solution(self) -> Tuple[float, list[float]]:
         """ Restarts the simulation with the solution values provided in a restart file 
         when the parameter restartFile and t_start is provided. If not provided time_start = 0.0"""
@@ -100,15 +142,15 @@ class ReadConfig:
             
 
     def store_solutions(self, msh) -> None:
-        """ Stores the oil distribution list over mesh in a txt file"""
-        try:    # Updated the given txt file
-            with open(self._restart_file, "w") as file:
-                for oil in msh.oil_list:
-                    file.write(f"{oil}\n")
-        except: # Makes a new one if txt file is not provided
-            with open(f"{self._toml_name}\solution.txt", "w") as file:
-                for oil in msh.oil_list:
-                    file.write(f"{oil}\n")
+        """ Stores the oil distribution list over mesh in a txt file,
+        a restart file for another mesh is kept as it is """
+        if self._restart_mesh == None and self._restart_file != None:   # Updates the given txt file
+            path = self._restart_file
+        else:   # Makes a new one if txt file is not provided or belongs to the restart mesh
+            path = f"{self._toml_name}\solution.txt"
+        with open(path, "w") as file:
+            for oil in msh.oil_list:
+                file.write(f"{oil}\n")
 
         
     def create_video(self) -> None:
@@ -0,0 +1,102 @@
+from config import ReadConfig
+from typing import List, NamedTuple, Optional, Sequence, Union
+import logging
+
+
+class Event(NamedTuple):
+    """ Something that happened at the end of a step, stop says if the simulation ends there """
+    name: str
+    step: int
+    time: float
+    value: float
+    stop: bool
+
+
+class EventMonitor:
+    """ Checks the reduced quantities of the simulation after every step for events and stop conditions.
+
+    The events are the oil in fishing grounds reaching each threshold for the first time, the total
+    amount of oil falling below mass_epsilon times the start amount, and a steady state where no oil
+    value changes faster than steady_tolerance per time unit for steady_steps steps in a row.
+    The simulation stops at the mass and steady state events, and when the last threshold is
+    reached if stop_on_threshold. Only a few numbers are compared, so a check costs little next to a step """
+    def __init__(self, start_mass: float, thresholds: Union[float, Sequence[float]] = (),
+                 stop_on_threshold: bool = False, mass_epsilon: Optional[float] = None,
+                 steady_tolerance: Optional[float] = None, steady_steps: int = 10,
+                 logger: Optional[logging.Logger] = None) -> None:
+        if isinstance(thresholds, (int, float)):
+            thresholds = [thresholds]
+        if mass_epsilon != None and not (0 <= mass_epsilon < 1):
+            raise ValueError("massEpsilon must be a part of the start amount of oil, from 0 up to 1")
+        if steady_tolerance != None and (steady_tolerance < 0 or steady_steps < 1):
+            raise ValueError("A steady state needs a tolerance of 0 or more and one or more steps")
+        if stop_on_threshold and not thresholds:
+            raise ValueError("stopOnThreshold needs a fishingThreshold")
+        self._start_mass = start_mass
+        self._thresholds = sorted(thresholds)
+        self._stop_on_threshold = stop_on_threshold
+        self._mass_epsilon = mass_epsilon
+        self._steady_tolerance = steady_tolerance
+        self._steady_steps = steady_steps
+        self._logger = logger
+        self._steady_count = 0
+        self._events: List[Event] = []
+
+    @property
+    def needs_mass(self) -> bool:
+        """ Returns if check needs the total amount of oil """
+        return self._mass_epsilon != None
+
+    @property
+    def needs_change(self) -> bool:
+        """ Returns if check needs how fast the oil values change """
+        return self._steady_tolerance != None
+
+    @property
+    def events(self) -> List[Event]:
+        """ Returns the events found so far, in order """
+        return self._events
+
+    @property
+    def stopped(self) -> Optional[Event]:
+        """ Returns the event the simulation stopped at, None if it has not stopped """
+        return next((event for event in self._events if event.stop), None)
+
+    def check(self, step: int, time: float, oil: float, mass: Optional[float] = None,
+              change: Optional[float] = None) -> bool:
+        """ Checks the amount of oil in fishing grounds, the total amount of oil and the largest
+        change of an oil value per time unit after a step. Returns if the simulation should stop.
+        An infinite change is not known, as right after the mesh is adapted, and is skipped by the steady state """
+        while self._thresholds and oil >= self._thresholds[0]:
+            threshold = self._thresholds.pop(0)
+            last = not self._thresholds
+            self._add(Event("fishing grounds reached threshold", step, time, threshold, last and self._stop_on_threshold))
+
+        if self._mass_epsilon != None and mass < self._mass_epsilon * self._start_mass:
+            self._add(Event("total amount of oil below epsilon", step, time, mass, True))
+
+        if self._steady_tolerance != None and change != float("inf"):
+            self._steady_count = self._steady_count + 1 if change <= self._steady_tolerance else 0
+            if self._steady_count >= self._steady_steps:
+                self._add(Event("steady state", step, time, change, True))
+        return self.stopped != None
+
+    def _add(self, event: Event) -> None:
+        """ Keeps and logs an event """
+        self._events.append(event)
+        if self._logger != None:
+            self._logger.info(describe(event))
+
+
+def describe(event: Event) -> str:
+    """ Returns the log line of an event """
+    ending = ", stopping" if event.stop else ""
+    return f"Event: {event.name} at time {event.time} (step {event.step}), value = {event.value}{ending}"
+
+
+def make_monitor(conf: ReadConfig, start_mass: float, logger: Optional[logging.Logger] = None) -> Optional[EventMonitor]:
+    """ Makes the event monitor from the events section of the config, None if there are no events """
+    if not conf.sections.get("events"):
+        return None
+    return EventMonitor(start_mass, conf.events("fishingThreshold", ()), conf.events("stopOnThreshold", False),
+                        conf.events("massEpsilon"), conf.events("steadyTolerance"), conf.events("steadySteps", 10), logger)
@@ -1,6 +1,13 @@
+from cache import ResultCache
 from config import ReadConfig, parseInput
+from events import EventMonitor, describe, make_monitor
+from src.Simulation.adapt import Refinement
+from src.Simulation.mesh import Mesh
+from src.Simulation.remap import remap
 from src.Simulation.solver import Solver
+from typing import Callable, Iterator, Optional, Tuple
 import logging
+import numpy as np
 import os
 
 """ setting up logger """
@@ -15,14 +22,11 @@ def make_logger(file_name):
 
     return logger
 
-def run(conf_path) -> Solver:
-    """ a for loop that runs the simulation with time and config"""
-    conf = ReadConfig(conf_path)
-
-    # Making logger
-    logger = make_logger(conf.logname)
-    logger.info(f"Running simulation for config file: {conf_path}")
-
+def setup_solver(conf: ReadConfig, logger: logging.Logger, mesh: Optional[Mesh] = None,
+                 load_mesh: Callable[[str], Mesh] = Mesh) -> Tuple[Solver, float, int]:
+    """ Reads the settings and geometry parameters from the config and makes the solver,
+    an already read mesh can be given so it is not read again, other meshes are read with load_mesh.
+    Returns the solver, the time step and the number of steps """
     # settings parameters
     time_start, old_solution = conf.find_solution()
     logger.info(f"time_start = {time_start}")
@@ -42,21 +46,118 @@ def run(conf_path) -> Solver:
     mesh_file = conf.geometry("meshName")
     logger.info(f"Mesh Name = {mesh_file}")
 
+    # A restart solution from another mesh is moved onto this mesh first
+    if conf.restart_mesh != None:
+        mesh = mesh if mesh != None else load_mesh(mesh_file)
+        old_solution = remap(load_mesh(conf.restart_mesh), old_solution, mesh, logger)
+        logger.info(f"Restart solution remapped from {conf.restart_mesh} to {mesh_file}")
+
+    precision = conf.settings("precision", "float64")
+    logger.info(f"Precision = {precision}")
+
+    local_stepping = conf.settings("localTimeStepping", False)
+    max_level = conf.settings("maxLevel", 8)
+    logger.info(f"Local time stepping = {local_stepping}")
+
+    threads = conf.settings("threads", 1)
+    logger.info(f"Threads = {threads}")
+
+    # The mesh is only adapted when adaptFrequency is given
+    refinement = None
+    adapt_frequency = conf.settings("adaptFrequency", 0)
+    if adapt_frequency:
+        refine_gradient = conf.settings("refineGradient", np.inf)
+        refinement = Refinement(adapt_frequency, conf.settings("refineThreshold"), conf.settings("coarsenThreshold"),
+                                refine_gradient, conf.settings("coarsenGradient", refine_gradient),
+                                conf.settings("maxRefine", 2))
+        logger.info(f"Adaptive mesh every {adapt_frequency} steps, refine above {refinement.refine} "
+                    f"or gradient {refinement.refine_gradient}, coarsen below {refinement.coarsen} "
+                    f"or gradient {refinement.coarsen_gradient}, max refinement = {refinement.max_level}")
+
+    msh = Solver(mesh if mesh != None else mesh_file, borders, old_solution, time_start, precision,
+                 local_stepping, max_level, threads, refinement)
+    if msh.multirate != None:
+        required_level = msh.multirate.required_level(dt)
+        if required_level > max_level:
+            raise ValueError(f"The time step {dt} needs local time stepping level {required_level} "
+                             f"to be stable, but maxLevel = {max_level}")
+        levels = np.bincount(msh.multirate.levels(dt))
+        local_work, global_work = msh.multirate.work(dt)
+        logger.info(f"Cells per time step level = {levels.tolist()}, max level = {max_level}")
+        logger.info(f"Face evaluations per step = {local_work}, with one time step = {global_work}")
+    if msh.adaptive != None:
+        logger.info(f"Triangles = {msh.n_triangles}, mesh that was read = {msh.adaptive.n_base} cells")
+    logger.info(f"Total amount of oil = {msh.mass()}")
+    return msh, dt, nSteps
+
+def time_loop(msh: Solver, dt: float, nSteps: int, frequency: Optional[int] = None,
+              frames: Optional[list] = None, monitor: Optional[EventMonitor] = None) -> Iterator[Tuple[int, float]]:
+    """ Solves nSteps time steps, plotting every frequency step if given and adding the images to frames.
+    Yields the step number and the amount of oil in fishing grounds after each step,
+    the loop ends after the step where the monitor says to stop """
+    for step in range(nSteps):
+        if frequency != None:
+            if step % frequency == 0:
+                frame = msh.plot()
+                if frames != None:
+                    frames.append(frame)
+        oil = msh.solve(dt)
+        stop = monitor != None and monitor.check(step, msh.time, oil,
+                                                 msh.mass() if monitor.needs_mass else None,
+                                                 msh.change() / dt if monitor.needs_change else None)
+        yield step, oil
+        if stop:
+            return
+
+def run(conf_path, cache: Optional[ResultCache] = None, recompute: bool = False) -> Solver:
+    """ a for loop that runs the simulation with time and config,
+    a cached result is used instead if there is one and recompute is not asked for """
+    conf = ReadConfig(conf_path)
+
+    # Making logger
+    logger = make_logger(conf.logname)
+    logger.info(f"Running simulation for config file: {conf_path}")
+
+    key = cache.key(conf) if cache != None else None
+    if key != None and not recompute and key in cache:
+        result = cache.restore(key, conf.toml_name)
+        logger.info(f"Restored cached result {key}")
+        for step, (time, oil) in enumerate(result.series):
+            for event in result.events:
+                if event.step == step:
+                    logger.info(describe(event))
+            logger.info(f"Time = {time} | Amount of oil in fishing grounds = {oil}")
+        stopped = next((event for event in result.events if event.stop), None)
+        if stopped != None:
+            logger.info(f"Stopped after {len(result.series)} of {conf.settings('nSteps')} steps at time {result.time}: {stopped.name}")
+        conf.store_solutions(result)
+        conf.create_video()
+        logger.info(f"Simulation completed. Results saved in folder: {conf.toml_name}")
+        return
+
+    msh, dt, nSteps = setup_solver(conf, logger)
+    monitor = make_monitor(conf, msh.mass(), logger)
+
     # Running simulation
-    msh = Solver(mesh_file, borders, old_solution, time_start)
-    for _ in range(nSteps):
+    series, frames = [], []
+    for _, oil in time_loop(msh, dt, nSteps, conf.frequency, frames, monitor):
         print(f"nSteps = {_}")
-        if conf.frequency != None:
-            if _ % conf.frequency == 0:
-                msh.plot()
-        oil = msh.solve(dt)
         logger.info(f"Time = {msh.time} | Amount of oil in fishing grounds = {oil}")
+        series.append((msh.time, oil))
+    if monitor != None and monitor.stopped != None:
+        logger.info(f"Stopped after {len(series)} of {nSteps} steps at time {msh.time}: {monitor.stopped.name}")
+
+    logger.info(f"Total amount of oil = {msh.mass()}")
+    msh.close()
 
     # Plotting last picture, Storing solution, Creating Video
-    msh.plot(conf.toml_name) # In config_name folder
-    msh.plot()              # In video imgs folder
+    result_frame = msh.plot(conf.toml_name) # In config_name folder
+    frames.append(msh.plot())               # In video imgs folder
     conf.store_solutions(msh)
     conf.create_video()
+    if cache != None:
+        cache.store(key, msh.time, msh.oil_list, series, frames, result_frame,
+                    monitor.events if monitor != None else None)
 
     logger.info(f"Simulation completed. Results saved in folder: {conf.toml_name}")
 
@@ -64,15 +165,21 @@ def run(conf_path) -> Solver:
 if __name__ == "__main__":
     args = parseInput()
 
-    if args.find_all:
-        folder = args.folder
-        config_files = [f for f in os.listdir(folder) if f.endswith('.toml')]
-        for conf in config_files:
+    if args.serve:
+        from server import serve
+        serve(args.host, args.port, args.socket, args.workers, args.mesh_cache)
+    else:
+        cache = ResultCache(args.result_cache, args.cache_entries, int(args.cache_mb * 2**20))
+
+        if args.find_all:
+            folder = args.folder
+            config_files = [f for f in os.listdir(folder) if f.endswith('.toml')]
+            for conf in config_files:
+                conf_path = os.path.join(folder, conf)
+                run(conf_path, cache, args.recompute)
+
+        if args.config_file:
+            conf = args.config_file
+            folder = args.folder
             conf_path = os.path.join(folder, conf)
-            run(conf_path)
-
-    if args.config_file:
-        conf = args.config_file
-        folder = args.folder
-        conf_path = os.path.join(folder, conf)
-        run(conf_path)
+            run(conf_path, cache, args.recompute)
@@ -0,0 +1,259 @@
+from config import ReadConfig
+from events import make_monitor
+from main import setup_solver, time_loop
+from src.Simulation.mesh import Mesh
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class MeshCache:
+    """ A least recently used cache of read meshes, keyed by the mesh path and the hash of the file """
+    def __init__(self, size: int = 4) -> None:
+        if size < 1:
+            raise ValueError("The mesh cache must be able to hold at least one mesh")
+        self._size = size
+        self._meshes = OrderedDict()
+        # The hash of every mesh file with the size and modification time it was found for
+        self._hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """ Returns the number of meshes in the cache """
+        return len(self._meshes)
+
+    @property
+    def files(self) -> list[str]:
+        """ Returns the paths of the cached meshes, least recently used first """
+        return [path for path, _ in self._meshes]
+
+    def key(self, file: str) -> Tuple[str, str]:
+        """ Returns the absolute path and the sha1 hash of the mesh file. The file is only
+        read and hashed again when its size or modification time has changed """
+        path = os.path.abspath(file)
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            with self._lock:
+                known = self._hashes.get(path)
+            if known != None and known[0] == signature:
+                return path, known[1]
+
+            digest = hashlib.sha1()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+        except OSError:
+            raise ValueError(f"Failed to read mesh file {file}")
+        with self._lock:
+            self._hashes[path] = (signature, digest.hexdigest())
+        return path, digest.hexdigest()
+
+    def get(self, file: str) -> Mesh:
+        """ Returns the mesh for the file, only reading it if it is not in the cache.
+        The solver keeps the oil values itself, so the same mesh is shared between runs """
+        key = self.key(file)
+        with self._lock:
+            mesh = self._meshes.get(key)
+            if mesh != None:
+                self._meshes.move_to_end(key)
+                return mesh
+
+        # The file is read without the lock so other workers can use the cache meanwhile
+        mesh = Mesh(file)
+        with self._lock:
+            # Another worker may have read the same file in the meantime, its mesh is kept
+            if key in self._meshes:
+                self._meshes.move_to_end(key)
+                return self._meshes[key]
+            self._meshes[key] = mesh
+            if len(self._meshes) > self._size:
+                (path, _), _ = self._meshes.popitem(last=False)
+                self._hashes.pop(path, None)
+        return mesh
+
+
+class SimulationServer:
+    """ A local http server that runs simulations from config payloads on a pool of workers.
+
+    POST /run takes a json object with the same sections as a toml config file and
+    streams json lines back: queued, started, one progress line per step with the amount
+    of oil in fishing grounds, and done with the time series and the final solution.
+    DELETE /jobs/<job> cancels a running simulation and GET /status lists jobs and cached meshes.
+    Images and videos are not made by the server, writeFrequency is ignored """
+    def __init__(self, workers: int = 2, mesh_cache: int = 4) -> None:
+        if workers < 1:
+            raise ValueError("The server needs at least one worker")
+        self._meshes = MeshCache(mesh_cache)
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._jobs: dict[str, threading.Event] = {}
+
+    @property
+    def meshes(self) -> MeshCache:
+        """ Returns the cache of read meshes """
+        return self._meshes
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765, socket: Optional[str] = None) -> asyncio.AbstractServer:
+        """ Starts listening on the unix socket if given, else on host and port """
+        if socket != None:
+            return await asyncio.start_unix_server(self.handle, path=socket)
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8765, socket: Optional[str] = None) -> None:
+        """ Serves requests until the server is stopped """
+        server = await self.start(host, port, socket)
+        address = socket if socket != None else f"http://{host}:{port}"
+        logger.info(f"Simulation server listening on {address}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """ Cancels all running simulations and stops the workers """
+        for cancel in self._jobs.values():
+            cancel.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ Handles one http request on the connection """
+        try:
+            method, path, body = await self._read_request(reader)
+            if method == "POST" and path == "/run":
+                await self._run(body, writer)
+            elif method == "DELETE" and path.startswith("/jobs/"):
+                job = path[len("/jobs/"):]
+                if job in self._jobs:
+                    self._jobs[job].set()
+                    await self._respond(writer, 200, {"cancelled": job})
+                else:
+                    await self._respond(writer, 404, {"error": f"No running job {job}"})
+            elif method == "GET" and path == "/status":
+                await self._respond(writer, 200, {"jobs": list(self._jobs), "meshes": self._meshes.files})
+            else:
+                await self._respond(writer, 404, {"error": f"Unknown request {method} {path}"})
+        except ValueError as e:
+            await self._respond(writer, 400, {"error": str(e)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        """ Reads the method, path and body of a http request """
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) < 2:
+            raise ValueError("Malformed request line")
+        method, path = request_line[0].upper(), request_line[1]
+
+        length = 0
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if line == "":
+                break
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        body = await reader.readexactly(length) if length > 0 else b""
+        return method, path, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, message: dict) -> None:
+        """ Writes a whole json response """
+        body = json.dumps(message).encode()
+        writer.write(self._header(status, "application/json", len(body)) + body)
+        await writer.drain()
+
+    @staticmethod
+    def _header(status: int, content_type: str, length: Optional[int] = None) -> bytes:
+        """ Makes the http response header, without a length the response ends when the connection closes """
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found"}
+        lines = [f"HTTP/1.1 {status} {reasons[status]}", f"Content-Type: {content_type}", "Connection: close"]
+        if length != None:
+            lines.append(f"Content-Length: {length}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+    async def _run(self, body: bytes, writer: asyncio.StreamWriter) -> None:
+        """ Runs the config payload on a worker and streams its messages back as json lines """
+        try:
+            payload = json.loads(body)
+            if not isinstance(payload, dict):
+                raise ValueError("The config payload must be a json object")
+            conf = ReadConfig(payload.get("name", "server"), payload, make_folder=False)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"The config payload is not valid json: {e}")
+
+        job = uuid.uuid4().hex
+        cancel = threading.Event()
+        self._jobs[job] = cancel
+
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+        emit = lambda message: loop.call_soon_threadsafe(messages.put_nowait, message)
+        loop.run_in_executor(self._pool, self._simulate, conf, cancel, emit)
+
+        try:
+            writer.write(self._header(200, "application/x-ndjson"))
+            message = {"event": "queued", "job": job}
+            while True:
+                writer.write((json.dumps(message) + "\n").encode())
+                await writer.drain()
+                if message["event"] in ("done", "cancelled", "error"):
+                    break
+                message = await messages.get()
+        finally:
+            # Stops the simulation if the client went away before it was done
+            cancel.set()
+            del self._jobs[job]
+
+    def _simulate(self, conf: ReadConfig, cancel: threading.Event, emit: Callable[[dict], None]) -> None:
+        """ Runs the simulation on a worker thread, the messages are given to emit """
+        try:
+            if cancel.is_set():
+                emit({"event": "cancelled", "step": 0, "time": None})
+                return
+            mesh = self._meshes.get(conf.geometry("meshName"))
+            msh, dt, nSteps = setup_solver(conf, logger, mesh, self._meshes.get)
+            monitor = make_monitor(conf, msh.mass(), logger)
+            emit({"event": "started", "steps": nSteps, "time": msh.time})
+
+            series, found = [], 0
+            try:
+                for step, oil in time_loop(msh, dt, nSteps, monitor=monitor):
+                    series.append([msh.time, float(oil)])
+                    if cancel.is_set():
+                        emit({"event": "cancelled", "step": step, "time": msh.time})
+                        return
+                    emit({"event": "progress", "step": step, "time": msh.time, "oil": float(oil)})
+                    # Events found in this step
+                    for event in monitor.events[found:] if monitor != None else []:
+                        emit({"event": "event", "name": event.name, "step": event.step, "time": event.time,
+                              "value": float(event.value), "stop": event.stop})
+                        found += 1
+            finally:
+                msh.close()
+
+            emit({"event": "done", "time": msh.time, "series": series,
+                  "solution": [float(oil) for oil in msh.oil_list]})
+        except Exception as e:
+            emit({"event": "error", "error": str(e)})
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, socket: Optional[str] = None,
+          workers: int = 2, mesh_cache: int = 4) -> None:
+    """ Runs the simulation server until it is interrupted """
+    logging.basicConfig(level=logging.INFO)
+    server = SimulationServer(workers, mesh_cache)
+    try:
+        asyncio.run(server.serve_forever(host, port, socket))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,457 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from .cells import Cell, Triangle
+from .geometry import FluxGeometry
+from .oilmath import OilMath
+import numpy as np
+
+# A refined triangle (a, b, c) gets four children, given by their corners in (a, b, c, m_ab, m_bc, m_ca)
+# where m are the edge midpoints. The children keep the corner order of the parent, the last one is the middle child
+CHILD_CORNERS = ((0, 3, 5), (3, 1, 4), (5, 4, 2), (3, 4, 5))
+# The child and child edge that cover the first and the second half of each parent edge,
+# edge k of a triangle goes from corner k to corner k + 1
+EDGE_HALVES = (((0, 0), (1, 0)), ((1, 1), (2, 1)), ((2, 2), (0, 2)))
+# The child edges that are shared by two children
+INNER_EDGES = (((0, 1), (3, 2)), ((1, 2), (3, 0)), ((2, 0), (3, 1)))
+# The parent edge of every outer child edge
+PARENT_EDGES = {half: edge for edge, halves in enumerate(EDGE_HALVES) for half in halves}
+# How close, as a part of the edge, the end of a face must be to an edge midpoint to be at it
+EPS = 1e-9
+# The arrays with a value for every cell index and the arrays with a value for every packed face
+CELL_ARRAYS = ("_is_triangle", "_leaf", "_parents", "_levels", "_roots", "_areas", "_midpoints", "_velocities",
+               "_slot_starts", "_slot_sizes", "_face_counts")
+FACE_ARRAYS = ("_face_neighbors", "_face_normals", "_face_velocities", "_face_coefficients")
+
+
+class Face(NamedTuple):
+    """ The part of a cell edge that is shared with one neighbor, from vertex start to vertex end
+    in the direction of the edge, with the scaled outward normal, the average velocity of
+    the two cells and the flux coefficient velocity dot normal """
+    neighbor: int
+    edge: int
+    start: int
+    end: int
+    normal: Tuple[float, float]
+    velocity: Tuple[float, float]
+    coefficient: float
+
+
+class Refinement:
+    """ When the adaptive mesh is changed. Every frequency steps the triangles with more oil than refine,
+    or a larger oil gradient than refine_gradient, are split into four, at most max_level times.
+    Four children are merged back when they all have less oil than coarsen and a smaller gradient than coarsen_gradient """
+    def __init__(self, frequency: int, refine: float, coarsen: float, refine_gradient: float = np.inf,
+                 coarsen_gradient: Optional[float] = None, max_level: int = 2) -> None:
+        if coarsen_gradient == None:
+            coarsen_gradient = refine_gradient
+        if frequency < 1:
+            raise ValueError("The mesh must be adapted every step or less often")
+        if coarsen > refine or coarsen_gradient > refine_gradient:
+            raise ValueError("The coarsen thresholds must not be above the refine thresholds")
+        if max_level < 0:
+            raise ValueError("The largest refinement level can not be negative")
+        self._frequency = frequency
+        self._refine = refine
+        self._coarsen = coarsen
+        self._refine_gradient = refine_gradient
+        self._coarsen_gradient = coarsen_gradient
+        self._max_level = max_level
+
+    @property
+    def frequency(self) -> int:
+        """ Returns how many steps there are between every change of the mesh """
+        return self._frequency
+
+    @property
+    def refine(self) -> float:
+        """ Returns the oil value above which triangles are split """
+        return self._refine
+
+    @property
+    def coarsen(self) -> float:
+        """ Returns the oil value below which triangles can be merged """
+        return self._coarsen
+
+    @property
+    def refine_gradient(self) -> float:
+        """ Returns the oil gradient above which triangles are split """
+        return self._refine_gradient
+
+    @property
+    def coarsen_gradient(self) -> float:
+        """ Returns the oil gradient below which triangles can be merged """
+        return self._coarsen_gradient
+
+    @property
+    def max_level(self) -> int:
+        """ Returns how many times a triangle of the mesh can be split """
+        return self._max_level
+
+
+class AdaptiveMesh:
+    """ A mesh whose triangles can be split into four and merged back while the oil moves.
+
+    The cells of the mesh keep their index, new cells get the index of a removed cell or the next one,
+    so the oil values stay in one array with a value for every index. Every cell stores its faces,
+    the parts of its edges shared with one neighbor each, so a triangle next to a split one simply
+    has two faces on that edge. Splitting or merging a triangle only changes its own faces and the
+    faces of its neighbors that point to it. A split gives every child the oil value of the parent
+    and a merge gives the parent the area weighted mean of its children, so no oil is lost or made.
+
+    The faces are also packed in arrays where every cell has a slot, and only the slots of the
+    changed cells are written after a change. A cell that needs a larger slot takes a free one of
+    that size or a new one at the end, and the slots are packed again when half of them are unused """
+    def __init__(self, cells: List[Cell]) -> None:
+        self._oil_math = OilMath()
+        self._n_base = len(cells)
+        self._vertices: List[Tuple[float, float]] = []
+        self._edge_midpoints: Dict[Tuple[int, int], int] = {}
+        self._corners: List[Optional[Tuple[int, ...]]] = []
+        self._children: List[Optional[Tuple[int, ...]]] = []
+        self._faces: List[List[Face]] = []
+        self._free: List[int] = []
+
+        # The arrays of every cell index have room for more cells than there are
+        self._is_triangle = np.zeros(0, dtype=bool)
+        self._leaf = np.zeros(0, dtype=bool)
+        self._parents = np.zeros(0, dtype=np.int64)
+        self._levels = np.zeros(0, dtype=np.int64)
+        self._roots = np.zeros(0, dtype=np.int64)
+        self._areas = np.zeros(0, dtype=np.float64)
+        self._midpoints = np.zeros((0, 2), dtype=np.float64)
+        self._velocities = np.zeros((0, 2), dtype=np.float64)
+        # Where the slot of every cell starts in the packed faces, how many faces fit and how many there are
+        self._slot_starts = np.zeros(0, dtype=np.int64)
+        self._slot_sizes = np.zeros(0, dtype=np.int64)
+        self._face_counts = np.zeros(0, dtype=np.int64)
+
+        # The packed faces up to n_faces, the start of the free slots of every size and the cells to write again
+        self._face_neighbors = np.zeros(0, dtype=np.int64)
+        self._face_normals = np.zeros((0, 2), dtype=np.float64)
+        self._face_velocities = np.zeros((0, 2), dtype=np.float64)
+        self._face_coefficients = np.zeros(0, dtype=np.float64)
+        self._n_faces = 0
+        self._free_slots: Dict[int, List[int]] = {}
+        self._changed = set()
+        self._packed = None
+
+        vertex_index = {}
+        for cell in cells:
+            corners = []
+            for point in cell.points:
+                if point not in vertex_index:
+                    vertex_index[point] = len(self._vertices)
+                    self._vertices.append((float(point.x), float(point.y)))
+                corners.append(vertex_index[point])
+            self._add_cell(cell.index, tuple(corners), isinstance(cell, Triangle), -1, 0, cell.index)
+
+        for cell in cells:
+            if not isinstance(cell, Triangle):
+                continue
+            corners = self._corners[cell.index]
+            for ngh in cell.neighbors:
+                if not (0 <= ngh < len(cells)):  # Skip invalid neighbors
+                    continue
+                shared = {vertex_index[point] for point in cells[ngh].points} & set(corners)
+                if len(shared) != 2:
+                    continue
+                edge = next(k for k in range(3) if {corners[k], corners[(k + 1) % 3]} == shared)
+                start, end = self._edge(cell.index, edge)
+                self._faces[cell.index].append(self._face(cell.index, ngh, edge, start, end))
+
+        self._base_triangles = self._is_triangle[:self._n_base].copy()
+        self._base_areas = self._areas[:self._n_base].copy()
+
+    @property
+    def n_cells(self) -> int:
+        """ Returns the number of cell indices in use or free, the length of the oil value array """
+        return len(self._corners)
+
+    @property
+    def n_base(self) -> int:
+        """ Returns the number of cells in the mesh that was read """
+        return self._n_base
+
+    @property
+    def leaves(self) -> np.ndarray:
+        """ Returns the indices of the triangles that are not split, the triangles that are updated """
+        return self._pack()[0]
+
+    @property
+    def levels(self) -> np.ndarray:
+        """ Returns how many times each leaf triangle is split from a triangle of the mesh that was read """
+        return self._levels[self.leaves]
+
+    @property
+    def midpoints(self) -> np.ndarray:
+        """ Returns the midpoint of every cell index, free indices keep the midpoint of their last cell """
+        return self._midpoints[:self.n_cells].copy()
+
+    def polygons(self) -> List[Tuple[int, np.ndarray]]:
+        """ Returns the index and the corners of every leaf triangle and every line """
+        return [(cell, np.array([self._vertices[vertex] for vertex in corners]))
+                for cell, corners in enumerate(self._corners)
+                if corners != None and self._children[cell] == None]
+
+    def geometry(self, dtype: np.dtype = np.float64) -> FluxGeometry:
+        """ Returns the flux geometry of the leaf triangles """
+        leaves, offsets, places, neighbors, wet, _, areas = self._pack()
+        normals, velocities = np.take(self._face_normals, places, axis=0), np.take(self._face_velocities, places, axis=0)
+        return FluxGeometry.from_faces(self.n_cells, leaves, areas, offsets, neighbors, wet,
+                                       normals, velocities, self._face_coefficients[places], dtype)
+
+    def project(self, u: np.ndarray) -> np.ndarray:
+        """ Returns the oil value of every cell of the mesh that was read, the area weighted mean
+        of the leaf triangles inside it. Lines keep their own value """
+        leaves, _, _, _, _, roots, areas = self._pack()
+        mass = np.bincount(roots, weights=u[leaves].astype(np.float64) * areas, minlength=self._n_base)
+        base = u[:self._n_base].astype(np.float64)
+        base[self._base_triangles] = mass[self._base_triangles] / self._base_areas[self._base_triangles]
+        return base
+
+    def gradients(self, u: np.ndarray) -> np.ndarray:
+        """ Returns the largest oil gradient of each leaf triangle, the difference in oil over
+        the distance between the midpoints for every neighbor triangle """
+        leaves, offsets, _, neighbors, wet, _, _ = self._pack()
+        counts = np.diff(offsets)
+        owners = np.repeat(leaves, counts)
+        distance = np.linalg.norm(np.take(self._midpoints, owners, axis=0) - np.take(self._midpoints, neighbors, axis=0), axis=1)
+        slopes = np.where(wet, np.abs(u[owners].astype(np.float64) - u[neighbors]) / distance, 0)
+        # The faces of every leaf are one after the other, the zero at the end is for leaves without faces
+        gradients = np.maximum.reduceat(np.append(slopes, 0.0), np.minimum(offsets[:-1], len(slopes)))
+        return np.where(counts > 0, gradients, 0.0)
+
+    def adapt(self, u: np.ndarray, refinement: Refinement) -> np.ndarray:
+        """ Merges and splits the leaf triangles by the oil values u and the thresholds of refinement.
+        Returns the oil values of the changed mesh, with a value for every cell index """
+        leaves = self.leaves
+        oil, gradients = u[leaves], self.gradients(u)
+        levels = self._levels[leaves]
+        split = (levels < refinement.max_level) & ((oil > refinement.refine) | (gradients > refinement.refine_gradient))
+        # Only split triangles have a parent to be merged into
+        mergeable = leaves[(levels > 0) & (oil < refinement.coarsen) & (gradients < refinement.coarsen_gradient)]
+
+        candidates = set(mergeable.tolist())
+        for parent in np.unique(self._parents[mergeable]).tolist():
+            if all(child in candidates for child in self._children[parent]):
+                self._coarsen(parent, u)
+
+        to_split = leaves[split]
+        new_cells = max(0, 4 * len(to_split) - len(self._free))
+        u = np.concatenate([u, np.zeros(new_cells, dtype=u.dtype)])
+        for cell in to_split.tolist():
+            self._refine(cell, u)
+        return u[:self.n_cells].copy()
+
+    def _add_cell(self, index: int, corners: Tuple[int, ...], triangle: bool, parent: int, level: int, root: int) -> int:
+        """ Sets the cell at index, a new index is added if it is the next one """
+        coords = [self._vertices[vertex] for vertex in corners]
+        if triangle:
+            (x1, y1), (x2, y2), (x3, y3) = coords
+            area = 0.5 * abs((x1 - x3) * (y2 - y1) - (x1 - x2) * (y3 - y1))
+        else:
+            area = 0.0
+        midpoint = (sum(x for x, _ in coords) / len(coords), sum(y for _, y in coords) / len(coords))
+        if index == len(self._corners):
+            self._corners.append(None)
+            self._children.append(None)
+            self._faces.append([])
+            for name in CELL_ARRAYS:
+                setattr(self, name, _reserve(getattr(self, name), index + 1))
+
+        self._corners[index], self._children[index], self._faces[index] = corners, None, []
+        self._is_triangle[index] = self._leaf[index] = triangle
+        self._parents[index], self._levels[index], self._roots[index] = parent, level, root
+        self._areas[index] = area
+        self._midpoints[index] = midpoint
+        self._velocities[index] = self._oil_math._v(*midpoint)
+        self._changed.add(index)
+        return index
+
+    def _new_cell(self, corners: Tuple[int, ...], parent: int) -> int:
+        """ Adds a child triangle of parent at a free index """
+        index = self._free.pop() if self._free else self.n_cells
+        return self._add_cell(index, corners, True, parent, self._levels[parent] + 1, self._roots[parent])
+
+    def _edge(self, cell: int, edge: int) -> Tuple[int, int]:
+        """ Returns the first and last vertex of an edge of a triangle """
+        corners = self._corners[cell]
+        return corners[edge], corners[(edge + 1) % 3]
+
+    def _edge_midpoint(self, start: int, end: int) -> int:
+        """ Returns the vertex in the middle of two vertices, it is made the first time it is asked for """
+        key = (min(start, end), max(start, end))
+        if key not in self._edge_midpoints:
+            (x1, y1), (x2, y2) = self._vertices[start], self._vertices[end]
+            self._edge_midpoints[key] = len(self._vertices)
+            self._vertices.append((0.5 * (x1 + x2), 0.5 * (y1 + y2)))
+        return self._edge_midpoints[key]
+
+    def _position(self, cell: int, edge: int, vertex: int) -> float:
+        """ Returns where a vertex is along an edge, 0 at the start and 1 at the end """
+        start, end = self._edge(cell, edge)
+        (x1, y1), (x2, y2), (x, y) = self._vertices[start], self._vertices[end], self._vertices[vertex]
+        return ((x - x1) * (x2 - x1) + (y - y1) * (y2 - y1)) / ((x2 - x1) ** 2 + (y2 - y1) ** 2)
+
+    def _face(self, cell: int, neighbor: int, edge: int, start: int, end: int) -> Face:
+        """ Makes the face of cell on the part of an edge from start to end that is shared with neighbor """
+        if self._position(cell, edge, start) > self._position(cell, edge, end):
+            start, end = end, start
+        (x1, y1), (x2, y2) = self._vertices[start], self._vertices[end]
+        normal = (-(y2 - y1), x2 - x1)
+
+        # Finding the right direction of scaled normal
+        mx, my = self._midpoints[cell].tolist()
+        if (x2 - mx) * normal[0] + (y2 - my) * normal[1] < 0:
+            normal = (-normal[0], -normal[1])
+
+        (vx1, vy1), (vx2, vy2) = self._velocities[cell].tolist(), self._velocities[neighbor].tolist()
+        velocity = (0.5 * (vx1 + vx2), 0.5 * (vy1 + vy2))
+        return Face(neighbor, edge, start, end, normal, velocity, velocity[0] * normal[0] + velocity[1] * normal[1])
+
+    def _replace_faces(self, cell: int, old: set, faces: List[Tuple[int, int, int]]) -> None:
+        """ Replaces the faces of a neighbor triangle cell to the cells in old with faces to
+        (neighbor, start, end), on the same edge """
+        if not self._is_triangle[cell]:
+            return
+        kept = [face for face in self._faces[cell] if face.neighbor not in old]
+        edge = next(face.edge for face in self._faces[cell] if face.neighbor in old)
+        self._faces[cell] = kept + [self._face(cell, neighbor, edge, start, end) for neighbor, start, end in faces]
+        self._changed.add(cell)
+
+    def _refine(self, cell: int, u: np.ndarray) -> None:
+        """ Splits a leaf triangle into four children that get its oil value """
+        a, b, c = self._corners[cell]
+        corners = (a, b, c, self._edge_midpoint(a, b), self._edge_midpoint(b, c), self._edge_midpoint(c, a))
+        children = tuple(self._new_cell(tuple(corners[k] for k in child), cell) for child in CHILD_CORNERS)
+        self._children[cell] = children
+        self._leaf[cell] = False
+        u[list(children)] = u[cell]
+
+        for (child, edge), (other, other_edge) in INNER_EDGES:
+            start, end = self._edge(children[child], edge)
+            self._faces[children[child]].append(self._face(children[child], children[other], edge, start, end))
+            self._faces[children[other]].append(self._face(children[other], children[child], other_edge, start, end))
+
+        # The faces of the parent are given to the children, faces over an edge midpoint are split in two
+        for face in self._faces[cell]:
+            (first, first_edge), (second, second_edge) = EDGE_HALVES[face.edge]
+            middle = corners[3 + face.edge]
+            if self._position(cell, face.edge, face.end) <= 0.5 + EPS:
+                parts = [(children[first], first_edge, face.start, face.end)]
+            elif self._position(cell, face.edge, face.start) >= 0.5 - EPS:
+                parts = [(children[second], second_edge, face.start, face.end)]
+            else:
+                parts = [(children[first], first_edge, face.start, middle),
+                         (children[second], second_edge, middle, face.end)]
+            for child, edge, start, end in parts:
+                self._faces[child].append(self._face(child, face.neighbor, edge, start, end))
+            self._replace_faces(face.neighbor, {cell}, [(child, start, end) for child, _, start, end in parts])
+        self._faces[cell] = []
+        self._changed.add(cell)
+        self._packed = None
+
+    def _coarsen(self, cell: int, u: np.ndarray) -> None:
+        """ Merges the four leaf children of a triangle back, it gets the area weighted mean of their oil values """
+        children = self._children[cell]
+        u[cell] = sum(u[child] * self._areas[child] for child in children) / self._areas[cell]
+
+        # The outer faces of the children, where faces to the same neighbor on one edge are joined
+        parts = []
+        for k, child in enumerate(children[:3]):
+            for face in self._faces[child]:
+                if face.neighbor not in children:
+                    edge = PARENT_EDGES[(k, face.edge)]
+                    parts.append((edge, face.neighbor, self._position(cell, edge, face.start), face.start, face.end))
+        faces = []
+        for edge, neighbor, _, start, end in sorted(parts):
+            if faces and faces[-1][:2] == [edge, neighbor] and faces[-1][3] == start:
+                faces[-1][3] = end
+            else:
+                faces.append([edge, neighbor, start, end])
+
+        self._faces[cell] = [self._face(cell, neighbor, edge, start, end) for edge, neighbor, start, end in faces]
+        for neighbor in dict.fromkeys(neighbor for _, neighbor, _, _ in faces):
+            self._replace_faces(neighbor, set(children),
+                                [(cell, start, end) for _, ngh, start, end in faces if ngh == neighbor])
+
+        for child in children:
+            self._corners[child], self._children[child], self._faces[child] = None, None, []
+            self._is_triangle[child] = self._leaf[child] = False
+            self._free.append(child)
+        self._children[cell] = None
+        self._leaf[cell] = True
+        self._changed.update(children)
+        self._changed.add(cell)
+        self._packed = None
+
+    def _pack(self) -> tuple:
+        """ Returns the leaf triangles in index order with the face offsets, the place of every face
+        in the packed faces, the neighbors, if the neighbors are triangles and the root and area
+        of every leaf, kept until the mesh is changed """
+        if self._packed == None:
+            self._store_faces()
+            leaves = np.flatnonzero(self._leaf[:self.n_cells])
+            offsets, places = self._places(leaves)
+            if 2 * offsets[-1] < self._n_faces:
+                # Most of the slots are unused, the faces of the leaves are packed one after the other again
+                for name in FACE_ARRAYS:
+                    setattr(self, name, np.take(getattr(self, name), places, axis=0))
+                self._slot_starts[:], self._slot_sizes[:] = 0, 0
+                self._slot_starts[leaves], self._slot_sizes[leaves] = offsets[:-1], np.diff(offsets)
+                self._n_faces = int(offsets[-1])
+                self._free_slots = {}
+                places = np.arange(self._n_faces)
+            neighbors = self._face_neighbors[places]
+            self._packed = (leaves, offsets, places, neighbors, self._is_triangle[neighbors],
+                            self._roots[leaves], self._areas[leaves])
+        return self._packed
+
+    def _places(self, leaves: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the face offsets of the leaves and where each of their faces is in the packed faces """
+        counts = self._face_counts[leaves]
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        places = np.repeat(self._slot_starts[leaves] - offsets[:-1], counts) + np.arange(offsets[-1])
+        return offsets, places
+
+    def _store_faces(self) -> None:
+        """ Writes the faces of the changed cells into their slots, cells that are not leaves give their slot back """
+        cells = sorted(self._changed)
+        self._changed.clear()
+        starts, sizes = self._slot_starts[cells].tolist(), self._slot_sizes[cells].tolist()
+        counts, places, faces = [], [], []
+        for k, (cell, leaf) in enumerate(zip(cells, self._leaf[cells].tolist())):
+            cell_faces = self._faces[cell] if leaf else []
+            count = len(cell_faces)
+            if count == 0 or count > sizes[k]:
+                if sizes[k] > 0:
+                    self._free_slots.setdefault(sizes[k], []).append(starts[k])
+                starts[k], sizes[k] = (self._take_slot(count) if count > 0 else 0), count
+            counts.append(count)
+            places.extend(range(starts[k], starts[k] + count))
+            faces.extend(cell_faces)
+        self._slot_starts[cells], self._slot_sizes[cells], self._face_counts[cells] = starts, sizes, counts
+        if faces:
+            self._face_neighbors[places] = [face.neighbor for face in faces]
+            self._face_normals[places] = [face.normal for face in faces]
+            self._face_velocities[places] = [face.velocity for face in faces]
+            self._face_coefficients[places] = [face.coefficient for face in faces]
+
+    def _take_slot(self, size: int) -> int:
+        """ Returns the start of a free slot for size faces, a new slot is added at the end if there is none """
+        free = self._free_slots.get(size)
+        if free:
+            return free.pop()
+        start = self._n_faces
+        self._n_faces += size
+        for name in FACE_ARRAYS:
+            setattr(self, name, _reserve(getattr(self, name), self._n_faces))
+        return start
+
+
+def _reserve(array: np.ndarray, size: int) -> np.ndarray:
+    """ Returns the array with room for at least size values, its length is doubled when it is full """
+    if len(array) >= size:
+        return array
+    grown = np.zeros((max(size, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
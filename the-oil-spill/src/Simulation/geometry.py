@@ -0,0 +1,129 @@
+from typing import List
+from .cells import Cell, Triangle
+from .oilmath import OilMath
+import numpy as np
+
+
+class FluxGeometry:
+    """ The geometry the solver needs for the flux between cells, computed once for a mesh.
+
+    Only triangles are updated. Every face of a triangle to a neighbor is stored in order,
+    the faces of updated cell k are faces[offsets[k]:offsets[k+1]]. A face has the index of
+    the neighbor, if the neighbor is a triangle (lines have no oil), the scaled normal,
+    the average velocity of the two cells and the flux coefficient velocity dot normal """
+    def __init__(self, cells: List[Cell], dtype: np.dtype = np.float64) -> None:
+        self._dtype = np.dtype(dtype)
+        self._n_cells = len(cells)
+        oil_math = OilMath()
+
+        updated, areas, offsets = [], [], [0]
+        neighbors, wet, normals, velocities, coefficients = [], [], [], [], []
+        for cell in cells:
+            if not isinstance(cell, Triangle):
+                continue
+            velocity = oil_math._v(*np.array(cell.midpoint.point))
+            for ngh, normal in zip(cell.neighbors, cell.calculate_normals(cells)):
+                if not (0 <= ngh < len(cells)):  # Skip invalid neighbors
+                    continue
+                neighbor = cells[ngh]
+                velocity_ngh = oil_math._v(*np.array(neighbor.midpoint.point))
+                v_avg = 0.5 * (np.array(velocity) + np.array(velocity_ngh))
+
+                neighbors.append(ngh)
+                wet.append(len(neighbor.points) >= 3)
+                normals.append(normal)
+                velocities.append(v_avg)
+                coefficients.append(np.dot(v_avg, normal))
+
+            updated.append(cell.index)
+            areas.append(cell.area())
+            offsets.append(len(neighbors))
+
+        self._store(updated, areas, offsets, neighbors, wet, normals, velocities, coefficients)
+
+    @classmethod
+    def from_faces(cls, n_cells: int, updated: list, areas: list, offsets: list, neighbors: list, wet: list,
+                   normals: list, velocities: list, coefficients: list, dtype: np.dtype = np.float64) -> "FluxGeometry":
+        """ Makes the geometry from faces that are already found, in the same layout as above """
+        geometry = cls.__new__(cls)
+        geometry._dtype = np.dtype(dtype)
+        geometry._n_cells = n_cells
+        geometry._store(updated, areas, offsets, neighbors, wet, normals, velocities, coefficients)
+        return geometry
+
+    def _store(self, updated: list, areas: list, offsets: list, neighbors: list, wet: list,
+               normals: list, velocities: list, coefficients: list) -> None:
+        """ Stores the geometry as arrays """
+        self._updated = np.array(updated, dtype=np.int64)
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._neighbors = np.array(neighbors, dtype=np.int64)
+        self._wet = np.array(wet, dtype=bool)
+        self._areas = np.array(areas, dtype=self._dtype)
+        self._normals = np.array(normals, dtype=self._dtype).reshape(-1, 2)
+        self._velocities = np.array(velocities, dtype=self._dtype).reshape(-1, 2)
+        # The coefficients are found in float64 and then stored with the given precision
+        self._coefficients = np.array(coefficients, dtype=np.float64).astype(self._dtype)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """ Returns the precision the geometry is stored with """
+        return self._dtype
+
+    @property
+    def n_cells(self) -> int:
+        """ Returns the number of cells in the mesh, updated or not """
+        return self._n_cells
+
+    @property
+    def updated(self) -> np.ndarray:
+        """ Returns the indices of the cells that are updated (triangles) """
+        return self._updated
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """ Returns where the faces of each updated cell start and end """
+        return self._offsets
+
+    @property
+    def neighbors(self) -> np.ndarray:
+        """ Returns the neighbor cell index of each face """
+        return self._neighbors
+
+    @property
+    def wet(self) -> np.ndarray:
+        """ Returns if the neighbor of each face can hold oil """
+        return self._wet
+
+    @property
+    def areas(self) -> np.ndarray:
+        """ Returns the area of each updated cell """
+        return self._areas
+
+    @property
+    def normals(self) -> np.ndarray:
+        """ Returns the scaled outward normal of each face """
+        return self._normals
+
+    @property
+    def velocities(self) -> np.ndarray:
+        """ Returns the average velocity over each face """
+        return self._velocities
+
+    @property
+    def coefficients(self) -> np.ndarray:
+        """ Returns the flux coefficient, velocity dot normal, of each face """
+        return self._coefficients
+
+    def stable_steps(self) -> np.ndarray:
+        """ Returns the largest stable time step of each updated cell, area over the outflow """
+        owners = np.repeat(np.arange(len(self._updated)), np.diff(self._offsets))
+        outflow = np.bincount(owners, weights=np.maximum(self._coefficients, 0).astype(np.float64),
+                              minlength=len(self._updated))
+        with np.errstate(divide="ignore"):
+            return np.where(outflow > 0, self._areas.astype(np.float64) / outflow, np.inf)
+
+    @property
+    def nbytes(self) -> int:
+        """ Returns the memory used by the geometry arrays """
+        return sum(array.nbytes for array in (self._updated, self._offsets, self._neighbors, self._wet,
+                                               self._areas, self._normals, self._velocities, self._coefficients))
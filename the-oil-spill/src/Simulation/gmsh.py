@@ -0,0 +1,146 @@
+from itertools import islice
+from typing import IO, List, NamedTuple
+import numpy as np
+
+# Gmsh element type numbers and the cell types they are read as
+ELEMENT_TYPES = {1: ("line", 2), 2: ("triangle", 3)}
+
+# Number of lines parsed at a time for large blocks
+CHUNK = 1 << 16
+
+
+class CellBlock(NamedTuple):
+    """ The cells of one element block, like a meshio cell block """
+    type: str
+    data: np.ndarray
+
+
+class GmshMesh:
+    """ The points and the triangle and line blocks read from a gmsh file, in the file order """
+    def __init__(self, points: np.ndarray, cells: List[CellBlock]) -> None:
+        self._points = points
+        self._cells = cells
+
+    @property
+    def points(self) -> np.ndarray:
+        """ Returns the x and y value of every node """
+        return self._points
+
+    @property
+    def cells(self) -> List[CellBlock]:
+        """ Returns the triangle and line blocks """
+        return self._cells
+
+
+def is_gmsh41_ascii(file: str) -> bool:
+    """ Checks if the file is a gmsh 4.1 ASCII mesh """
+    try:
+        with open(file, "r") as f:
+            if f.readline().strip() != "$MeshFormat":
+                return False
+            version, file_type, *_ = f.readline().split()
+    except (OSError, UnicodeDecodeError, ValueError):
+        return False
+    return version == "4.1" and file_type == "0"
+
+
+def read_gmsh41(file: str) -> GmshMesh:
+    """ Reads the nodes and the triangle and line elements of a gmsh 4.1 ASCII file.
+    Every block is parsed from the file straight into NumPy arrays, the other sections are skipped """
+    points, tag_to_index, cells = None, None, []
+    with open(file, "rb") as f:
+        for line in f:
+            section = line.decode().strip()
+            if section == "$MeshFormat":
+                version, file_type, *_ = _header(f)
+                if version != "4.1" or file_type != "0":
+                    raise ValueError(f"{file} is not a gmsh 4.1 ASCII file")
+            elif section == "$Nodes":
+                points, tag_to_index = _read_nodes(f)
+            elif section == "$Elements":
+                if tag_to_index is None:
+                    raise ValueError("The $Elements section comes before the $Nodes section")
+                cells = _read_elements(f, tag_to_index)
+            elif section.startswith("$") and not section.startswith("$End"):
+                _skip_section(f, "$End" + section[1:])
+
+    if points is None:
+        raise ValueError(f"{file} has no $Nodes section")
+    return GmshMesh(points, cells)
+
+
+def _skip_section(f: IO, end: str) -> None:
+    """ Skips the lines until the end of the section """
+    for line in f:
+        if line.decode().strip() == end:
+            return
+    raise ValueError(f"Missing {end}")
+
+
+def _header(f: IO) -> List[str]:
+    """ Returns the values of the next line that is not empty,
+    the rest of a line can be left after the values of a block are parsed """
+    for line in f:
+        values = line.decode().split()
+        if values:
+            return values
+    raise ValueError("Unexpected end of file")
+
+
+def _read_rows(f: IO, rows: int, n_columns: int, columns: List[int], dtype: type, out: np.ndarray) -> None:
+    """ Parses the columns of the next rows lines, with n_columns values each, into out,
+    a chunk of lines at a time """
+    for start in range(0, rows, CHUNK):
+        stop = min(start + CHUNK, rows)
+        count = (stop - start) * n_columns
+        values = np.fromfile(f, dtype=dtype, count=count, sep=" ")
+        if values.size != count:
+            raise ValueError(f"Expected {stop - start} lines with {n_columns} values")
+        out[start:stop] = values.reshape(stop - start, n_columns)[:, columns]
+
+
+def _read_nodes(f: IO) -> tuple:
+    """ Reads the $Nodes section into a points array and a node tag to point index array """
+    n_blocks, n_nodes, _, max_tag = (int(value) for value in _header(f))
+    points = np.empty((n_nodes, 2), dtype=np.float64)
+    tag_to_index = np.full(max_tag + 1, -1, dtype=np.int64)
+
+    index = 0
+    for _ in range(n_blocks):
+        dim, _, parametric, n_block = (int(value) for value in _header(f))
+        tags = np.empty((n_block, 1), dtype=np.int64)
+        _read_rows(f, n_block, 1, [0], np.int64, tags)
+        tag_to_index[tags[:, 0]] = np.arange(index, index + n_block)
+        # Parametric nodes have their parametric coordinates after x, y and z
+        n_columns = 3 + dim if parametric else 3
+        _read_rows(f, n_block, n_columns, [0, 1], np.float64, points[index:index + n_block])
+        index += n_block
+
+    _skip_section(f, "$EndNodes")
+    return points, tag_to_index
+
+
+def _read_elements(f: IO, tag_to_index: np.ndarray) -> List[CellBlock]:
+    """ Reads the triangle and line blocks of the $Elements section, other elements are skipped """
+    n_blocks = int(_header(f)[0])
+    cells = []
+    for _ in range(n_blocks):
+        _, _, element_type, n_block = (int(value) for value in _header(f))
+        if element_type not in ELEMENT_TYPES:
+            for _ in islice(f, n_block):
+                pass
+            continue
+
+        cell_type, n_points = ELEMENT_TYPES[element_type]
+        data = np.empty((n_block, n_points), dtype=np.int64)
+        _read_rows(f, n_block, n_points + 1, list(range(1, n_points + 1)), np.int64, data)
+        if data.size and (data.min() < 0 or data.max() >= len(tag_to_index)):
+            raise ValueError("An element uses a node tag outside the $Nodes section")
+        # The tags are checked, so clip mode can map them in place without a buffer
+        np.take(tag_to_index, data, out=data, mode="clip")
+        if np.any(data < 0):
+            raise ValueError("An element uses a node that is not in the $Nodes section")
+        cells.append(CellBlock(cell_type, data))
+
+    _skip_section(f, "$EndElements")
+    return cells
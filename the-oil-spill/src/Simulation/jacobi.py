@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+from .geometry import FluxGeometry
+import numpy as np
+
+
+class JacobiStepper:
+    """ Updates every triangle from the old oil values into a new array.
+
+    No cell sees a value written in the same step, so the result does not depend on the order
+    of the cells. The triangles are split into contiguous chunks that are updated on a pool of
+    threads with NumPy operations, which release the GIL. Every cell sums its own faces in the
+    same order whatever chunk it is in, so the result is the same for any number of threads """
+    def __init__(self, geometry: FluxGeometry, threads: int = 1) -> None:
+        if threads < 1:
+            raise ValueError("The solver needs at least one thread")
+        self._threads = threads
+        self._pool = ThreadPoolExecutor(max_workers=threads) if threads > 1 else None
+        self.update(geometry)
+
+    @property
+    def threads(self) -> int:
+        """ Returns the number of threads the step is run on """
+        return self._threads
+
+    def update(self, geometry: FluxGeometry) -> None:
+        """ Steps on a changed geometry, the threads are kept """
+        self._geometry = geometry
+        counts = np.diff(geometry.offsets)
+        self._face_cells = geometry.updated[np.repeat(np.arange(len(geometry.updated)), counts)]
+        self._wet = geometry.wet.astype(geometry.dtype)
+        self._empty = counts == 0
+
+        # Chunks with about the same number of faces
+        bounds = np.searchsorted(geometry.offsets, np.linspace(0, geometry.offsets[-1], self._threads + 1))
+        bounds[0], bounds[-1] = 0, len(geometry.updated)
+        self._chunks = [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    def close(self) -> None:
+        """ Stops the threads """
+        if self._pool != None:
+            self._pool.shutdown()
+
+    def step(self, u_old: np.ndarray, u_new: np.ndarray, dt: float) -> None:
+        """ Writes the oil values one time step dt after u_old into u_new,
+        the cells that are not updated are left as they are in u_new """
+        area_consts = u_old.dtype.type(dt) / self._geometry.areas
+        if self._pool == None:
+            for start, stop in self._chunks:
+                self._step_chunk(start, stop, u_old, u_new, area_consts)
+        else:
+            futures = [self._pool.submit(self._step_chunk, start, stop, u_old, u_new, area_consts)
+                       for start, stop in self._chunks]
+            for future in futures:
+                future.result()
+
+    def _step_chunk(self, start: int, stop: int, u_old: np.ndarray, u_new: np.ndarray, area_consts: np.ndarray) -> None:
+        """ Updates the updated cells start to stop """
+        geometry = self._geometry
+        first, last = geometry.offsets[start], geometry.offsets[stop]
+        coefficients = geometry.coefficients[first:last]
+
+        # Upwind flux g over every face of the chunk, lines have no oil
+        u_own = u_old[self._face_cells[first:last]]
+        u_ngh = u_old[geometry.neighbors[first:last]] * self._wet[first:last]
+        g_flux = np.where(coefficients > 0, u_own, u_ngh) * coefficients
+
+        # Sum of the faces of each cell, the zero at the end is for cells without faces
+        g_sum = np.add.reduceat(np.append(g_flux, g_flux.dtype.type(0)), geometry.offsets[start:stop] - first)
+        g_sum[self._empty[start:stop]] = 0
+
+        cells = geometry.updated[start:stop]
+        u_new[cells] = np.maximum(0, u_old[cells] - area_consts[start:stop] * g_sum)
@@ -1,5 +1,6 @@
 from typing import List
 from .cells import Point, Cell, CellFactory
+from .gmsh import is_gmsh41_ascii, read_gmsh41
 import meshio
 
 class Mesh:
@@ -16,10 +17,11 @@ class Mesh:
     
     def _read_mesh(self, file: str) -> None:
         """ Reads the mesh from a file and puts the readed meshio in th cell factory, 
+        gmsh 4.1 ASCII files are read straight into arrays without meshio,
         Gives an error if the file doesnt exist,
         saves the list of all cells in self"""
         try:
-            msh = meshio.read(file)
+            msh = read_gmsh41(file) if is_gmsh41_ascii(file) else meshio.read(file)
         except Exception as e:
             raise ValueError(f"Failed to read mesh file {file}")
         
@@ -28,6 +30,13 @@ class Mesh:
         self._cells = make_cells(msh)
 
     def _find_neighbors(self) -> None:
-        """ Runs the find_neighbors method for all cells """
+        """ Runs the find_neighbors method for all cells, each cell only gets the cells
+        it shares a point with, in index order, so the whole mesh is not searched for every cell """
+        point_cells = {}
         for cell in self.cells:
-            cell.find_neighbors(self.cells)
\ No newline at end of file
+            for point in cell.points:
+                point_cells.setdefault(point, []).append(cell)
+
+        for cell in self.cells:
+            candidates = {other.index: other for point in cell.points for other in point_cells[point]}
+            cell.find_neighbors([candidates[index] for index in sorted(candidates)])
\ No newline at end of file
@@ -0,0 +1,104 @@
+from typing import Tuple
+from .geometry import FluxGeometry
+import numpy as np
+
+
+class MultirateStepper:
+    """ Local time stepping for meshes with very different cell sizes.
+
+    Every triangle gets a level k so that dt / 2**k is below its stable step, area over outflow.
+    A step of dt is done in 2**K substeps of dt / 2**K, where K is the largest level, and a
+    cell of level k is only updated every 2**(K-k) substeps. A face is evaluated at the rate of
+    the finer of its two cells, the higher level, and both cells add the flux to what they have pending until the
+    end of their own step, so the oil leaving one cell is exactly the oil entering the other """
+    def __init__(self, geometry: FluxGeometry, max_level: int = 8) -> None:
+        if max_level < 0:
+            raise ValueError("The largest local time stepping level can not be negative")
+        self._max_level = max_level
+        self.update(geometry)
+
+    def update(self, geometry: FluxGeometry) -> None:
+        """ Steps on a changed geometry, the levels are found again at the next step """
+        self._geometry = geometry
+        self._dt = None
+        counts = np.diff(geometry.offsets)
+        self._owners = np.repeat(np.arange(len(geometry.updated)), counts)
+        # Index in the updated cells of each face neighbor, or -1 if the neighbor is not updated
+        local = np.full(geometry.n_cells, -1, dtype=np.int64)
+        local[geometry.updated] = np.arange(len(geometry.updated))
+        self._neighbors_local = local[geometry.neighbors]
+
+    @property
+    def max_level(self) -> int:
+        """ Returns the largest level a cell can get """
+        return self._max_level
+
+    def stable_steps(self) -> np.ndarray:
+        """ Returns the largest stable time step of each updated cell, area over the outflow """
+        return self._geometry.stable_steps()
+
+    def required_level(self, dt: float) -> int:
+        """ Returns the level the smallest stable step needs for a step of dt, which can be above the largest level """
+        smallest = self.stable_steps().min(initial=np.inf)
+        return max(int(np.ceil(np.log2(dt / smallest))), 0) if smallest < np.inf else 0
+
+    def levels(self, dt: float) -> np.ndarray:
+        """ Returns the level of each updated cell, the smallest k with dt / 2**k below its stable step.
+        The levels are cut off at the largest level, check required_level for a step that is too large """
+        with np.errstate(divide="ignore"):
+            levels = np.ceil(np.log2(dt / self.stable_steps()))
+        return np.clip(levels, 0, self._max_level).astype(np.int64)
+
+    def work(self, dt: float) -> Tuple[int, int]:
+        """ Returns the number of face evaluations for a step of dt with local time stepping,
+        and with every cell using the smallest time step """
+        cell_levels = self.levels(dt)
+        top = cell_levels.max(initial=0)
+        face_levels = self._face_levels(cell_levels)
+        return int(np.sum(2 ** face_levels)), int(len(face_levels) * 2 ** top)
+
+    def _face_levels(self, cell_levels: np.ndarray) -> np.ndarray:
+        """ Returns the level of each face, the finer level of the two cells """
+        owner_levels = cell_levels[self._owners]
+        neighbor_levels = np.where(self._neighbors_local >= 0, cell_levels[self._neighbors_local], owner_levels)
+        return np.maximum(owner_levels, neighbor_levels)
+
+    def _prepare(self, dt: float) -> None:
+        """ Groups the faces and cells by level for the time step """
+        cell_levels = self.levels(dt)
+        face_levels = self._face_levels(cell_levels)
+        self._top = int(cell_levels.max(initial=0))
+        self._face_groups = [np.flatnonzero(face_levels == level) for level in range(self._top + 1)]
+        self._cell_groups = [np.flatnonzero(cell_levels == level) for level in range(self._top + 1)]
+        self._dt = dt
+
+    def step(self, u: np.ndarray, dt: float) -> None:
+        """ Updates the oil values u of all cells one time step dt in place """
+        if dt != self._dt:
+            self._prepare(dt)
+        geometry = self._geometry
+        dtype = u.dtype
+        fine_dt = dt / 2 ** self._top
+        pending = np.zeros(len(geometry.updated), dtype=np.float64)
+
+        for substep in range(2 ** self._top):
+            # Faces are evaluated at the start of their step with the values of the last updates
+            for level, faces in enumerate(self._face_groups):
+                period = 2 ** (self._top - level)
+                if substep % period != 0 or len(faces) == 0:
+                    continue
+                coefficients = geometry.coefficients[faces]
+                u_owner = u[geometry.updated[self._owners[faces]]]
+                u_ngh = np.where(geometry.wet[faces], u[geometry.neighbors[faces]], 0)
+                g_flux = np.where(coefficients > 0, u_owner, u_ngh) * coefficients
+                area_const = (fine_dt * period) / geometry.areas[self._owners[faces]]
+                pending -= np.bincount(self._owners[faces], weights=(area_const * g_flux).astype(np.float64),
+                                       minlength=len(pending))
+
+            # Cells are updated at the end of their step
+            for level, cells in enumerate(self._cell_groups):
+                if (substep + 1) % 2 ** (self._top - level) != 0 or len(cells) == 0:
+                    continue
+                index = geometry.updated[cells]
+                u[index] = np.maximum(0, u[index] + pending[cells]).astype(dtype)
+                pending[cells] = 0
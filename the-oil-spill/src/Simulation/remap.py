@@ -0,0 +1,162 @@
+from typing import List, Optional, Tuple
+from .cells import Triangle
+from .mesh import Mesh
+import logging
+import numpy as np
+
+# Number of target triangles whose overlaps are found at a time
+CHUNK = 4096
+# Largest relative difference of the total amount of oil that is taken as round-off
+MASS_TOLERANCE = 1e-9
+
+
+class GridIndex:
+    """ A spatial index over triangles: a uniform grid where every grid cell lists the triangles
+    whose bounding box touches it. The grid cells are about the size of a triangle, so a box
+    only has to be compared with the few triangles in the grid cells under it """
+    def __init__(self, triangles: np.ndarray, cell_size: Optional[float] = None) -> None:
+        self._low = triangles.min(axis=1)
+        self._high = triangles.max(axis=1)
+        self._origin = self._low.min(axis=0)
+        extent = self._high.max(axis=0) - self._origin
+        if cell_size == None:
+            cell_size = np.mean(np.max(self._high - self._low, axis=1))
+        self._cell_size = max(float(cell_size), 1e-12)
+        self._shape = np.maximum(np.ceil(extent / self._cell_size).astype(np.int64), 1)
+
+        triangle_ids, cell_ids = self._covered(self._low, self._high)
+        order = np.argsort(cell_ids, kind="stable")
+        self._entries = triangle_ids[order]
+        self._offsets = np.searchsorted(cell_ids[order], np.arange(np.prod(self._shape) + 1))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """ Returns the number of grid cells in x and y """
+        return int(self._shape[0]), int(self._shape[1])
+
+    def query(self, low: np.ndarray, high: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the pairs of box index and triangle index where the box from low to high
+        overlaps the bounding box of the triangle, each pair once """
+        boxes, cells = self._covered(low, high)
+        counts = self._offsets[cells + 1] - self._offsets[cells]
+        starts = np.repeat(self._offsets[cells] - np.cumsum(counts) + counts, counts)
+        boxes = np.repeat(boxes, counts)
+        triangles = self._entries[starts + np.arange(len(starts))]
+
+        # A triangle is found in every grid cell the box shares with it
+        pairs = np.unique(boxes * len(self._low) + triangles)
+        boxes, triangles = pairs // len(self._low), pairs % len(self._low)
+        overlap = np.all((low[boxes] <= self._high[triangles]) & (self._low[triangles] <= high[boxes]), axis=1)
+        return boxes[overlap], triangles[overlap]
+
+    def _covered(self, low: np.ndarray, high: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the pairs of box index and grid cell index for every grid cell each box touches """
+        first = np.clip(np.floor((low - self._origin) / self._cell_size).astype(np.int64), 0, self._shape - 1)
+        last = np.clip(np.floor((high - self._origin) / self._cell_size).astype(np.int64), 0, self._shape - 1)
+        widths = last[:, 0] - first[:, 0] + 1
+        counts = widths * (last[:, 1] - first[:, 1] + 1)
+        boxes = np.repeat(np.arange(len(low)), counts)
+        local = np.arange(len(boxes)) - np.repeat(np.cumsum(counts) - counts, counts)
+        x = first[boxes, 0] + local % widths[boxes]
+        y = first[boxes, 1] + local // widths[boxes]
+        return boxes, y * self._shape[0] + x
+
+
+def triangle_areas(triangles: np.ndarray) -> np.ndarray:
+    """ Returns the area of every triangle in an (n, 3, 2) array """
+    return np.abs(_signed_areas(triangles))
+
+
+def intersection_areas(subjects: np.ndarray, clips: np.ndarray) -> np.ndarray:
+    """ Returns the overlapping area of every pair of triangles in two (n, 3, 2) arrays.
+    Every subject is clipped by the three sides of its clip triangle at once (Sutherland-Hodgman) """
+    clips = clips.copy()
+    clockwise = _signed_areas(clips) < 0
+    clips[clockwise] = clips[clockwise][:, ::-1]
+
+    polygons, counts = subjects.astype(np.float64), np.full(len(subjects), 3)
+    for side in range(3):
+        polygons, counts = _clip(polygons, counts, clips[:, side], clips[:, (side + 1) % 3])
+
+    index = np.arange(polygons.shape[1])
+    following = np.where(index + 1 < counts[:, None], index + 1, 0)
+    x, y = polygons[:, :, 0], polygons[:, :, 1]
+    x_next, y_next = np.take_along_axis(x, following, axis=1), np.take_along_axis(y, following, axis=1)
+    terms = np.where(index < counts[:, None], x * y_next - x_next * y, 0)
+    return 0.5 * np.abs(terms.sum(axis=1))
+
+
+def remap(source: Mesh, oil_list: List[float], target: Mesh, logger: Optional[logging.Logger] = None) -> List[float]:
+    """ Moves the oil values of the source mesh to the target mesh. Every target triangle gets the
+    area weighted mean of the source triangles it overlaps. When both meshes cover the same domain
+    the values are scaled to remove the round-off in the total amount of oil. Oil in parts of the
+    source mesh the target does not cover is lost and logged. Lines, and triangles outside the
+    source mesh, get no oil """
+    if len(oil_list) != len(source.cells):
+        raise ValueError(f"The oil distribution has {len(oil_list)} values, but the source mesh has {len(source.cells)} cells")
+    source_index, source_triangles = _triangles(source)
+    target_index, target_triangles = _triangles(target)
+    source_oil = np.asarray(oil_list, dtype=np.float64)[source_index]
+    grid = GridIndex(source_triangles)
+
+    mass = np.zeros(len(target_triangles))
+    for start in range(0, len(target_triangles), CHUNK):
+        chunk = target_triangles[start:start + CHUNK]
+        targets, sources = grid.query(chunk.min(axis=1), chunk.max(axis=1))
+        areas = intersection_areas(chunk[targets], source_triangles[sources])
+        mass[start:start + len(chunk)] = np.bincount(targets, weights=areas * source_oil[sources], minlength=len(chunk))
+
+    target_areas = triangle_areas(target_triangles)
+    oil = mass / target_areas
+    remapped_mass = np.dot(oil, target_areas)
+    source_mass = np.dot(source_oil, triangle_areas(source_triangles))
+    if remapped_mass > 0 and abs(remapped_mass - source_mass) <= MASS_TOLERANCE * source_mass:
+        oil *= source_mass / remapped_mass
+    elif remapped_mass != source_mass and logger != None:
+        logger.warning(f"The target mesh does not cover the source mesh, {source_mass - remapped_mass} "
+                       f"of {source_mass} oil is not remapped")
+
+    result = np.zeros(len(target.cells))
+    result[target_index] = oil
+    return result.tolist()
+
+
+def _triangles(mesh: Mesh) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns the cell index and the corners of every triangle in the mesh """
+    triangles = [cell for cell in mesh.cells if isinstance(cell, Triangle)]
+    corners = np.array([[point.point for point in cell.points] for cell in triangles], dtype=np.float64)
+    return np.array([cell.index for cell in triangles], dtype=np.int64), corners.reshape(-1, 3, 2)
+
+
+def _signed_areas(triangles: np.ndarray) -> np.ndarray:
+    """ Returns the area of every triangle, negative for clockwise corners """
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    return 0.5 * ((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1]))
+
+
+def _clip(polygons: np.ndarray, counts: np.ndarray, start: np.ndarray, end: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ Keeps the part of every convex polygon to the left of the line from start to end.
+    polygons has the corners of each polygon first, counts says how many there are """
+    n, width = polygons.shape[:2]
+    index = np.arange(width)
+    valid = index < counts[:, None]
+    previous = np.where(index == 0, np.maximum(counts - 1, 0)[:, None], index - 1)
+    current_points = polygons
+    previous_points = np.take_along_axis(polygons, previous[:, :, None], axis=1)
+
+    direction = (end - start)[:, None, :]
+    side = lambda points: (direction[..., 0] * (points[..., 1] - start[:, None, 1])
+                           - direction[..., 1] * (points[..., 0] - start[:, None, 0]))
+    current_side, previous_side = side(current_points), side(previous_points)
+    current_in, previous_in = current_side >= 0, previous_side >= 0
+
+    # Where an edge crosses the line, the crossing comes before the corner it leads to
+    crossing = valid & (current_in != previous_in)
+    denominator = np.where(crossing, previous_side - current_side, 1)
+    t = np.where(crossing, previous_side / denominator, 0)
+    points = np.stack([previous_points + t[..., None] * (current_points - previous_points), current_points], axis=2)
+    keep = np.stack([crossing, valid & current_in], axis=2)
+
+    points, keep = points.reshape(n, 2 * width, 2), keep.reshape(n, 2 * width)
+    order = np.argsort(~keep, axis=1, kind="stable")[:, :width + 1]
+    return np.take_along_axis(points, order[:, :, None], axis=1), keep.sum(axis=1)
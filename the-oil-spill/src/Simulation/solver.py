@@ -1,20 +1,53 @@
-from .cells import Triangle
+from .adapt import AdaptiveMesh, Refinement
+from .geometry import FluxGeometry
+from .jacobi import JacobiStepper
 from .mesh import Mesh
+from .multirate import MultirateStepper
 from .oilmath import OilMath
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 import numpy as np
+from typing import Optional, Union
 
 class Solver:
-    """ A class that simulates the oil distribution over a mesh given a time """
-    def __init__(self, file: str, borders: list, oil_list: list, time: float) -> None:
-        self._mesh = Mesh(file)
+    """ A class that simulates the oil distribution over a mesh given a time,
+    the oil values are always given on the cells of the mesh that was read """
+    precisions = ("float64", "float32")
+
+    def __init__(self, file: Union[str, Mesh], borders: list, oil_list: list, time: float,
+                 precision: str = "float64", local_stepping: bool = False, max_level: int = 8,
+                 threads: int = 1, refinement: Optional[Refinement] = None) -> None:
+        if precision not in self.precisions:
+            raise ValueError(f"Unknown precision {precision}, use one of {self.precisions}")
+        self._mesh = file if isinstance(file, Mesh) else Mesh(file)
         self._time = time
         self._borders = borders
+        self._dtype = np.dtype(precision)
         if self._time == 0.0: 
-            self._oil_list = self._start_oil_distribution()
-        else: 
-            self._oil_list = oil_list
+            oil_list = self._start_oil_distribution()
+        if len(oil_list) != len(self._mesh.cells):
+            raise ValueError(f"The oil distribution has {len(oil_list)} values, but the mesh has {len(self._mesh.cells)} cells")
+        self._oil_list = np.array(oil_list, dtype=self._dtype)
+        self._in_fishground = np.array([
+            self._borders[0][0] < cell.midpoint.x < self._borders[0][1] and
+            self._borders[1][0] < cell.midpoint.y < self._borders[1][1]
+            for cell in self._mesh.cells], dtype=bool)
+
+        self._local_stepping = local_stepping
+        self._max_level = max_level
+        self._threads = threads
+        self._jacobi = None
+        self._multirate = None
+        self._refinement = refinement
+        self._adaptive = AdaptiveMesh(self._mesh.cells) if refinement != None else None
+        self._steps = 0
+        # If the second array has the values from before the last step
+        self._has_previous = False
+        # The start distribution is refined down to the finest level before the first step
+        if self._adaptive != None:
+            for _ in range(refinement.max_level):
+                self._oil_list = self._adaptive.adapt(self._oil_list, refinement)
+        self._build()
 
     @property
     def time(self) -> float:
@@ -24,48 +57,131 @@ class Solver:
     @property
     def oil_list(self) -> list:
         """ Return a list of oil value for each cell index in order """
-        return self._oil_list
+        return self._base_oil().tolist()
+
+    @property
+    def precision(self) -> str:
+        """ Returns the precision the oil values and geometry are stored with """
+        return self._dtype.name
+
+    @property
+    def multirate(self) -> Optional[MultirateStepper]:
+        """ Returns the local time stepper, None if every cell takes the same time step """
+        return self._multirate
+
+    @property
+    def adaptive(self) -> Optional[AdaptiveMesh]:
+        """ Returns the adaptive mesh, None if the mesh that was read is used as it is """
+        return self._adaptive
+
+    @property
+    def stable_step(self) -> float:
+        """ Returns the largest time step that is stable for every triangle that is updated """
+        return self._stable_step
+
+    @property
+    def n_triangles(self) -> int:
+        """ Returns the number of triangles that are updated """
+        return len(self._geometry.updated)
+
+    @property
+    def nbytes(self) -> int:
+        """ Returns the memory used by the oil values and the geometry arrays """
+        return self._oil_list.nbytes + self._next_oil_list.nbytes + self._geometry.nbytes
+
+    def close(self) -> None:
+        """ Stops the threads of the solver """
+        if self._jacobi != None:
+            self._jacobi.close()
+
+    def mass(self) -> float:
+        """ Returns the total amount of oil in the triangles, oil value times area summed in float64 """
+        updated = self._geometry.updated
+        return float(np.dot(self._oil_list[updated].astype(np.float64), self._geometry.areas.astype(np.float64)))
      
+    def change(self) -> float:
+        """ Returns the largest change of an oil value in the last step,
+        infinite before the first step and right after the mesh is adapted """
+        if not self._has_previous:
+            return float("inf")
+        updated = self._geometry.updated
+        return float(np.max(np.abs(self._oil_list[updated].astype(np.float64) - self._next_oil_list[updated]), initial=0))
+
+    def _build(self) -> None:
+        """ Makes the geometry for the current mesh, the stepper is made once and then given the new geometry """
+        if self._adaptive == None:
+            self._geometry = FluxGeometry(self._mesh.cells, self._dtype)
+        else:
+            self._geometry = self._adaptive.geometry(self._dtype)
+        if self._local_stepping:
+            if self._multirate == None:
+                self._multirate = MultirateStepper(self._geometry, self._max_level)
+            else:
+                self._multirate.update(self._geometry)
+        elif self._jacobi == None:
+            self._jacobi = JacobiStepper(self._geometry, self._threads)
+        else:
+            self._jacobi.update(self._geometry)
+        self._stable_step = float(self._geometry.stable_steps().min(initial=np.inf))
+        self._next_oil_list = self._oil_list.copy()
+
+    def _base_oil(self) -> np.ndarray:
+        """ Returns the oil values on the cells of the mesh that was read """
+        if self._adaptive == None:
+            return self._oil_list
+        return self._adaptive.project(self._oil_list)
+
     def _start_oil_distribution(self) -> list:
         """ Returns a list of the oil distribution when time is 0 """
-        return [cell.u for cell in self._mesh.cells]
+        oil_math = OilMath()
+        return [oil_math.calculate_u(cell.midpoint.x, cell.midpoint.y) for cell in self._mesh.cells]
     
     def solve(self, dt: float) -> float:
         """ Updates every cell in the mesh for their oil amount and 
         finds out the total amount of oil in fish grounds for the time"""
+        # Local time stepping can split the step into 2**max_level substeps for the smallest triangles
+        substeps = 2 ** self._max_level if self._multirate != None else 1
+        if self._adaptive != None and dt > self._stable_step * substeps:
+            raise ValueError(f"The time step {dt} is above the stable time step {self._stable_step} of the adapted mesh "
+                             f"with {substeps} substeps, use a smaller time step, a lower maxRefine or localTimeStepping")
         self._time += dt
-        u_new_list = []
-        u_in_fishground_list = []
-
-        for cell in self._mesh.cells:
-            oil_math = OilMath()
-            if isinstance(cell, Triangle):
-                u_new = oil_math.update_oil_distribution(cell, self._mesh.cells, dt)
-                u_new = max(0, u_new)
-                cell.u = u_new
-            u_new_list.append(cell.u)
-
-            if self._borders[0][0] < cell.midpoint.x < self._borders[0][1]:
-                if self._borders[1][0] < cell.midpoint.y < self._borders[1][1]:
-                    u_in_fishground_list.append(cell.u)
-        
-        self._oil_list = u_new_list
-        return sum(u_in_fishground_list)
-
-
-    def plot(self, folder: str = "imgs") -> None:
-        """ Plots the oil distribution across the mesh and saves the output image in given / img folder """
+        if self._multirate != None:
+            # The step is done in place, the second array keeps the old values
+            np.copyto(self._next_oil_list, self._oil_list)
+            self._multirate.step(self._oil_list, dt)
+        else:
+            # Double buffered, the new values are written to the second array which then becomes the current one
+            self._jacobi.step(self._oil_list, self._next_oil_list, dt)
+            self._oil_list, self._next_oil_list = self._next_oil_list, self._oil_list
+        self._has_previous = True
+
+        self._steps += 1
+        if self._adaptive != None and self._steps % self._refinement.frequency == 0:
+            self._oil_list = self._adaptive.adapt(self._oil_list, self._refinement)
+            self._build()
+            self._has_previous = False
+        return sum(self._base_oil()[self._in_fishground].tolist())
+
+
+    def plot(self, folder: str = "imgs") -> str:
+        """ Plots the oil distribution across the mesh and saves the output image in given / img folder,
+        returns the path of the image """
+        if self._adaptive == None:
+            polygons = [(cell.index, np.array([p.point for p in cell.points])) for cell in self._mesh.cells]
+        else:
+            polygons = self._adaptive.polygons()
+        oil_values = self._oil_list[[index for index, _ in polygons]]
+
         # Prepare color mapping
         scalar_map = plt.cm.ScalarMappable(cmap="viridis")
-        scalar_map.set_array(self._oil_list)
-        umax, umin = max(self._oil_list), min(self._oil_list)
+        scalar_map.set_array(oil_values)
+        umax, umin = max(oil_values), min(oil_values)
 
         fig, ax = plt.subplots(figsize=(8, 8))
         ax.set_aspect("equal")
 
         # Plot each cell with oil concentration color
-        for cell, oil_amount in zip(self._mesh.cells, self._oil_list):
-            triangle = np.array([p.point for p in cell.points])
+        for (_, triangle), oil_amount in zip(polygons, oil_values):
             color = plt.cm.viridis(np.clip((oil_amount - umin) / (umax - umin), 0, 1))
             ax.add_patch(plt.Polygon(triangle, color=color, alpha=0.9))
 
@@ -88,4 +204,5 @@ class Solver:
         # Saves image
         output_path = f"{folder}/oil_dist_{self._time:.2f}.png"
         plt.savefig(output_path, dpi=300)
-        plt.close(fig)
\ No newline at end of file
+        plt.close(fig)
+        return output_path
\ No newline at end of file